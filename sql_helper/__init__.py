@@ -1,10 +1,25 @@
 from .connection import SQLConnection
 from .guild_settings import GuildSettings
+from .guild_settings_cache import GuildSettingsCache
+from .guild_settings_store import GuildSettingsStore
+from .blocked_emotes_index import BlockedEmotesIndex
+from .filtered_hashes import FilteredHashes
+from .lru_cache import LRUCache
+from .expiring_cache import ExpiringCache
+from .emote_hash_cache import EmoteHashCache
+from .guild_member_cache import GuildMemberCache
+from .mutual_guilds_cache import MutualGuildsCache
+from .perceptual_index import PerceptualIndex
+from .write_buffer import WriteBuffer
+from .score_decay import ScoreDecay, DecayCheckpoint
+from .emote_scanner import EmoteScanner, ScanCheckpoint
 from .webhook import Webhook
 from .pack import Pack
 from .guild_feature import GuildFeature
 from .premium_user import PremiumUser
 from .emoji import SQLEmoji
-from .guild_message import GuildMessage
+from .emoji_columns import EmojiColumns
+from .guild_message import GuildMessage, GuildMessagePage
 from .premium_last_charge_status import PremiumLastChargeStatus
 from .persona import Persona
+from .member_sync_result import MemberSyncResult
@@ -1,11 +1,95 @@
-from typing import Optional, Callable
+import time
+from contextlib import nullcontext
+from contextvars import ContextVar
+from functools import wraps
+from inspect import isasyncgenfunction, iscoroutinefunction
+from itertools import count
+from typing import AsyncIterator, Optional, Callable, Dict, List, TYPE_CHECKING
 
 from aiopg import IsolationLevel
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE, TRANSACTION_STATUS_INERROR
 from discord import Guild, Emoji
 from .emoji import SQLEmoji
+from .guild_settings_cache import GuildSettingsCache
+from .blocked_emotes_index import BlockedEmotesIndex
+from .filtered_hashes import FilteredHashes
+from .emote_hash_cache import EmoteHashCache, NULL_HASH
+from .perceptual_index import PerceptualIndex
+from .guild_member_cache import GuildMemberCache
+from .mutual_guilds_cache import MutualGuildsCache
+from .async_list import async_list
+
+if TYPE_CHECKING:
+    from .metrics import PoolMetrics
+
+_stream_ids = count()
+# The public method queries are being run for, the outermost one if they call each other
+_method: ContextVar[Optional[str]] = ContextVar("sql_helper_method", default=None)
+
+
+def _labelled(name: str, f):
+    # The label is only read by pool_metrics, without them the method's own coroutine or generator is returned
+    if isasyncgenfunction(f):
+
+        @wraps(f)
+        def generator_wrapper(self, *args, **kwargs):
+            generator = f(self, *args, **kwargs)
+            if self.pool_metrics is None:
+                return generator
+            return _labelled_generator(name, generator)
+
+        return generator_wrapper
+
+    @wraps(f)
+    def wrapper(self, *args, **kwargs):
+        coroutine = f(self, *args, **kwargs)
+        if self.pool_metrics is None:
+            return coroutine
+        return _labelled_coroutine(name, coroutine)
+
+    return wrapper
+
+
+async def _labelled_coroutine(name: str, coroutine):
+    token = _method.set(_method.get() or name)
+    try:
+        return await coroutine
+    finally:
+        _method.reset(token)
+
+
+async def _labelled_generator(name: str, generator):
+    # Only set while the generator runs, not while the caller has it suspended
+    try:
+        while True:
+            token = _method.set(_method.get() or name)
+            try:
+                item = await generator.__anext__()
+            except StopAsyncIteration:
+                return
+            finally:
+                _method.reset(token)
+            yield item
+    finally:
+        await generator.aclose()
 
 
 class _PostgresConnection:
+    def __init_subclass__(cls, **kwargs):
+        # Labels the public methods of every mixin so pool_metrics can tell which one ran each query
+        super().__init_subclass__(**kwargs)
+        for name, f in list(vars(cls).items()):
+            if name.startswith("_"):
+                continue
+            inner = getattr(f, "__wrapped__", None)
+            if iscoroutinefunction(f) or isasyncgenfunction(f):
+                setattr(cls, name, _labelled(name, f))
+            elif inner is not None and (
+                iscoroutinefunction(inner) or isasyncgenfunction(inner)
+            ):
+                # async_list methods, labelled inside so the label is set while they run
+                setattr(cls, name, async_list(_labelled(name, inner)))
+
     def __init__(
         self,
         pool,
@@ -14,6 +98,17 @@ class _PostgresConnection:
         profiler=None,
         *,
         isolation_level: Optional[IsolationLevel] = None,
+        ranked_emote_lookup: bool = False,
+        guild_settings_cache: Optional[GuildSettingsCache] = None,
+        blocked_emotes_index: Optional[BlockedEmotesIndex] = None,
+        filtered_hashes: Optional[FilteredHashes] = None,
+        emote_hash_cache: Optional[EmoteHashCache] = None,
+        perceptual_index: Optional[PerceptualIndex] = None,
+        guild_member_cache: Optional[GuildMemberCache] = None,
+        mutual_guilds_cache: Optional[MutualGuildsCache] = None,
+        lazy: bool = False,
+        pool_metrics: Optional["PoolMetrics"] = None,
+        stream_batch_size: Optional[int] = None,
     ):
         self.pool = pool
         self.pool_acq = None
@@ -24,21 +119,209 @@ class _PostgresConnection:
         self._get_emoji = get_emoji
         self.profiler = profiler
         self.isolation_level = isolation_level
+        self.ranked_emote_lookup = ranked_emote_lookup
+        self.guild_settings_cache = guild_settings_cache
+        self.blocked_emotes_index = blocked_emotes_index
+        self.filtered_hashes = filtered_hashes
+        self.emote_hash_cache = emote_hash_cache
+        self.perceptual_index = perceptual_index
+        self.guild_member_cache = guild_member_cache
+        self.mutual_guilds_cache = mutual_guilds_cache
+        self.lazy = lazy
+        self.pool_metrics = pool_metrics
+        self.stream_batch_size = stream_batch_size
+        self._acquire_wait = None
+        self._acquired_at = None
+        self._method = None
+        self._streams = []
 
     async def __aenter__(self) -> "_PostgresConnection":
+        if self.lazy:
+            # Don't take a connection from the pool until the first query
+            self.cur = _LazyCursor(self)
+        else:
+            await self._acquire()
+        return self
+
+    async def _acquire(self):
+        start_time = time.perf_counter()
         self.pool_acq = self.pool.acquire()
         self.conn = await self.pool_acq.__aenter__()
+        self._acquired_at = time.perf_counter()
+        self._acquire_wait = self._acquired_at - start_time
         self.cur_acq = self.conn.cursor(isolation_level=self.isolation_level)
         self.cur = await self.cur_acq.__aenter__()
         if self.profiler is not None:
             self.cur.execute = self.profiler(self.cur.execute)
-        return self
+        if self.pool_metrics is not None:
+            self.cur.execute = self._observe_queries(self.cur.execute)
+            self.pool_metrics.update_pool(self.pool)
+        return self.cur
+
+    def _observe_queries(self, execute):
+        async def execute_wrapper(*args, **kwargs):
+            method = _method.get() or "unknown"
+            # The connection's acquire wait and hold time go to the method that first used it
+            if self._method is None:
+                self._method = method
+            start_time = time.perf_counter()
+            try:
+                return await execute(*args, **kwargs)
+            finally:
+                self.pool_metrics.observe_query(
+                    self.isolation_level, method, time.perf_counter() - start_time
+                )
+
+        return execute_wrapper
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
-        await self.cur_acq.__aexit__(exc_type, exc_val, exc_tb)
-        rtn = await self.pool_acq.__aexit__(exc_type, exc_val, exc_tb)
-        self.pool_acq = None
-        self.conn = None
-        self.cur_acq = None
-        self.cur = None
+        rtn = None
+        # Streams a caller stopped iterating early still have a cursor open, close it before
+        # the connection goes back to the pool
+        streams, self._streams = self._streams, []
+        try:
+            for stream in streams:
+                await stream.aclose()
+        finally:
+            if self.cur_acq is not None:
+                await self.cur_acq.__aexit__(exc_type, exc_val, exc_tb)
+                rtn = await self.pool_acq.__aexit__(exc_type, exc_val, exc_tb)
+                if self.pool_metrics is not None:
+                    self.pool_metrics.observe(
+                        self.isolation_level,
+                        self._method or "unknown",
+                        self._acquire_wait,
+                        time.perf_counter() - self._acquired_at,
+                    )
+                    self.pool_metrics.update_pool(self.pool)
+            self._acquire_wait = None
+            self._acquired_at = None
+            self._method = None
+            self.pool_acq = None
+            self.conn = None
+            self.cur_acq = None
+            self.cur = None
+        return rtn
+
+    def _stream(
+        self, query: str, parameters=None, *, batch_size: Optional[int] = None
+    ) -> AsyncIterator:
+        # With a batch size, from the argument or stream_batch_size, rows are read through a server-side
+        # cursor a batch at a time rather than all at once. aiopg can't use named cursors, so it's declared in SQL.
+        # The connection closes any stream still open when it exits.
+        stream = self._stream_rows(
+            query, parameters, batch_size or self.stream_batch_size
+        )
+        self._streams.append(stream)
+        return stream
+
+    async def _stream_rows(self, query: str, parameters, batch_size: Optional[int]):
+        if not batch_size:
+            await self.cur.execute(query, parameters=parameters)
+            for row in await self.cur.fetchall():
+                yield row
+            return
+        name = f"sql_helper_stream_{next(_stream_ids)}"
+        # A cursor declared inside the caller's transaction lives as long as that does
+        transaction = nullcontext() if self._in_transaction() else self.cur.begin()
+        async with transaction:
+            await self.cur.execute(
+                f"DECLARE {name} NO SCROLL CURSOR FOR {query}", parameters=parameters
+            )
+            try:
+                while True:
+                    await self.cur.execute(f"FETCH FORWARD {batch_size} FROM {name}")
+                    rows = await self.cur.fetchall()
+                    for row in rows:
+                        yield row
+                    if len(rows) < batch_size:
+                        break
+            except GeneratorExit:
+                # Stopped early. After an error the transaction is aborted and has already dropped the cursor,
+                # running CLOSE then would only raise over the original error.
+                if not self._transaction_failed():
+                    await self.cur.execute(f"CLOSE {name}")
+                raise
+            await self.cur.execute(f"CLOSE {name}")
+
+    def _in_transaction(self) -> bool:
+        return (
+            self.conn is not None
+            and self.conn.raw.get_transaction_status() != TRANSACTION_STATUS_IDLE
+        )
+
+    def _transaction_failed(self) -> bool:
+        return (
+            self.conn is not None
+            and self.conn.raw.get_transaction_status() == TRANSACTION_STATUS_INERROR
+        )
+
+    async def _get_emote_hashes_by_id(
+        self, emote_ids: List[int], *, keep_null: bool = False
+    ) -> Dict[int, Optional[str]]:
+        # Emotes whose emote_hash is NULL are left out, or given None with keep_null.
+        # They're cached either way, so they aren't looked up again.
+        cache = self.emote_hash_cache
+        rtn = {}
+        if cache is not None:
+            missing = []
+            for emote_id in emote_ids:
+                emote_hash = cache.get(emote_id)
+                if emote_hash is None:
+                    missing.append(emote_id)
+                elif emote_hash is not NULL_HASH:
+                    rtn[emote_id] = emote_hash
+                elif keep_null:
+                    rtn[emote_id] = None
+            emote_ids = missing
+            generation = cache.generation()
+        if not emote_ids:
+            return rtn
+        await self.cur.execute(
+            "SELECT emote_id, emote_hash FROM emote_ids WHERE emote_id=ANY(%(emote_ids)s)",
+            parameters={"emote_ids": emote_ids},
+        )
+        results = await self.cur.fetchall()
+        for emote_id, emote_hash in results:
+            if emote_hash is not None or keep_null:
+                rtn[emote_id] = emote_hash
+            if cache is not None:
+                cache.set(
+                    emote_id,
+                    NULL_HASH if emote_hash is None else emote_hash,
+                    generation,
+                )
         return rtn
+
+    def _cached_emote_hash(self, emote_id: int) -> Optional[str]:
+        if self.emote_hash_cache is not None:
+            emote_hash = self.emote_hash_cache.get(emote_id)
+            if emote_hash is not NULL_HASH:
+                return emote_hash
+
+
+class _LazyCursor:
+    # Takes the place of the cursor in lazy mode, acquiring the real one on first use
+    def __init__(self, connection: _PostgresConnection):
+        self._connection = connection
+
+    async def execute(self, *args, **kwargs):
+        cur = await self._connection._acquire()
+        return await cur.execute(*args, **kwargs)
+
+    def begin(self):
+        return _LazyTransaction(self._connection)
+
+
+class _LazyTransaction:
+    def __init__(self, connection: _PostgresConnection):
+        self._connection = connection
+        self._transaction = None
+
+    async def __aenter__(self):
+        cur = await self._connection._acquire()
+        self._transaction = cur.begin()
+        return await self._transaction.__aenter__()
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        return await self._transaction.__aexit__(exc_type, exc_val, exc_tb)
@@ -1,17 +1,33 @@
-from typing import Awaitable
+from functools import wraps
+from inspect import isasyncgen
+from typing import AsyncIterator, Awaitable, Union
 
 
 class AsyncList:
-    def __init__(self, contents: Awaitable):
+    # Wraps either a coroutine returning a list, or an async generator which is streamed when iterated
+    def __init__(self, contents: Union[Awaitable, AsyncIterator]):
         self.contents = contents
 
     def __await__(self):
+        if isasyncgen(self.contents):
+            return self._collect().__await__()
         return self.contents.__await__()
 
     async def __aiter__(self):
-        for i in await self:
-            yield i
+        if isasyncgen(self.contents):
+            async for i in self.contents:
+                yield i
+        else:
+            for i in await self:
+                yield i
+
+    async def _collect(self) -> list:
+        return [i async for i in self.contents]
 
 
 def async_list(f):
-    return lambda *args, **kwargs: AsyncList(f(*args, **kwargs))
+    @wraps(f)
+    def wrapper(*args, **kwargs):
+        return AsyncList(f(*args, **kwargs))
+
+    return wrapper
@@ -0,0 +1,98 @@
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+NOTIFY_CHANNEL = "blocked_emotes"
+
+
+class BlockedEmotesIndex:
+    # Blocked emote ids and hashes per guild, so BlockedEmojisMixin can answer most checks without a query.
+    # Only guilds with blocks are held, which is a small minority.
+    def __init__(self):
+        self.loaded = False
+        self._emotes: Dict[int, Dict[int, Optional[str]]] = {}
+        self._hashes: Dict[int, Counter] = {}
+
+    def __len__(self) -> int:
+        return len(self._emotes)
+
+    def load(self, rows: Iterable[Tuple[int, int, Optional[str]]]):
+        # Replaces everything with rows of (guild_id, emote_id, emote_hash)
+        self._emotes.clear()
+        self._hashes.clear()
+        for guild_id, emote_id, emote_hash in rows:
+            self.add(guild_id, emote_id, emote_hash)
+        self.loaded = True
+
+    def refresh(
+        self, guild_ids: List[int], rows: Iterable[Tuple[int, int, Optional[str]]]
+    ):
+        # Replaces only the given guilds with rows of (guild_id, emote_id, emote_hash)
+        for guild_id in guild_ids:
+            self._emotes.pop(guild_id, None)
+            self._hashes.pop(guild_id, None)
+        for guild_id, emote_id, emote_hash in rows:
+            self.add(guild_id, emote_id, emote_hash)
+
+    def add(self, guild_id: int, emote_id: int, emote_hash: Optional[str]):
+        emotes = self._emotes.setdefault(guild_id, {})
+        if emote_id in emotes:
+            return
+        emotes[emote_id] = emote_hash
+        if emote_hash is not None:
+            self._hashes.setdefault(guild_id, Counter())[emote_hash] += 1
+
+    def remove(self, guild_id: int, emote_id: int):
+        emotes = self._emotes.get(guild_id)
+        if emotes is None or emote_id not in emotes:
+            return
+        emote_hash = emotes.pop(emote_id)
+        if emote_hash is not None:
+            hashes = self._hashes[guild_id]
+            hashes[emote_hash] -= 1
+            if not hashes[emote_hash]:
+                del hashes[emote_hash]
+        if not emotes:
+            del self._emotes[guild_id]
+            self._hashes.pop(guild_id, None)
+
+    def has_blocks(self, guild_id: int) -> bool:
+        return guild_id in self._emotes
+
+    def guild_ids(self) -> List[int]:
+        return list(self._emotes)
+
+    def blocked_ids(self, guild_id: int, emote_ids: Iterable[int]) -> List[int]:
+        emotes = self._emotes.get(guild_id, {})
+        return [emote_id for emote_id in emote_ids if emote_id in emotes]
+
+    def blocked_hashes(
+        self, guild_id: int, emote_hashes: Dict[int, Optional[str]]
+    ) -> List[int]:
+        # emote_hashes maps emote_id to emote_hash for the emotes being checked
+        hashes = self._hashes.get(guild_id, {})
+        return [
+            emote_id
+            for emote_id, emote_hash in emote_hashes.items()
+            if emote_hash in hashes
+        ]
+
+    async def listen(self, pool):
+        # Long running. Reloads a guild whenever any process changes its blocks, see BlockedEmojisMixin
+        async with pool.acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(f"LISTEN {NOTIFY_CHANNEL}")
+                await cur.execute(
+                    "SELECT guild_id, emote_id, emote_hash FROM blocked_emotes"
+                )
+                self.load(await cur.fetchall())
+                try:
+                    while True:
+                        notification = await conn.notifies.get()
+                        guild_id = int(notification.payload)
+                        await cur.execute(
+                            "SELECT guild_id, emote_id, emote_hash FROM blocked_emotes WHERE guild_id=%(guild_id)s",
+                            parameters={"guild_id": guild_id},
+                        )
+                        self.refresh([guild_id], await cur.fetchall())
+                finally:
+                    self.loaded = False
@@ -1,8 +1,19 @@
-from typing import Optional, Callable
+from typing import Optional, Callable, TYPE_CHECKING
 
 from aiopg import IsolationLevel
 from discord import Guild, Emoji
 from .emoji import SQLEmoji
+from .guild_settings_cache import GuildSettingsCache
+from .blocked_emotes_index import BlockedEmotesIndex
+from .filtered_hashes import FilteredHashes
+from .emote_hash_cache import EmoteHashCache
+from .perceptual_index import PerceptualIndex
+from .guild_member_cache import GuildMemberCache
+from .mutual_guilds_cache import MutualGuildsCache
+from .write_buffer import WriteBuffer
+
+if TYPE_CHECKING:
+    from .metrics import PoolMetrics, WriteBufferMetrics
 
 from .mixins import *
 
@@ -33,11 +44,35 @@ class SQLConnection:
         get_guild: Optional[Callable[[int], Optional[Guild]]] = None,
         get_emoji: Optional[Callable[[SQLEmoji], Optional[Emoji]]] = None,
         profiler=None,
+        *,
+        ranked_emote_lookup: bool = False,
+        guild_settings_cache: Optional[GuildSettingsCache] = None,
+        blocked_emotes_index: Optional[BlockedEmotesIndex] = None,
+        filtered_hashes: Optional[FilteredHashes] = None,
+        emote_hash_cache: Optional[EmoteHashCache] = None,
+        perceptual_index: Optional[PerceptualIndex] = None,
+        guild_member_cache: Optional[GuildMemberCache] = None,
+        mutual_guilds_cache: Optional[MutualGuildsCache] = None,
+        lazy: bool = False,
+        pool_metrics: Optional["PoolMetrics"] = None,
+        stream_batch_size: Optional[int] = None,
     ):
         self.pool = pool
         self._get_guild = get_guild or (lambda id: None)
         self._get_emoji = get_emoji or (lambda emoji: None)
         self.profiler = profiler
+        self.ranked_emote_lookup = ranked_emote_lookup
+        self.guild_settings_cache = guild_settings_cache
+        self.blocked_emotes_index = blocked_emotes_index
+        self.filtered_hashes = filtered_hashes
+        self.emote_hash_cache = emote_hash_cache
+        self.perceptual_index = perceptual_index
+        self.guild_member_cache = guild_member_cache
+        self.mutual_guilds_cache = mutual_guilds_cache
+        self.lazy = lazy
+        self.pool_metrics = pool_metrics
+        self.stream_batch_size = stream_batch_size
+        self.write_buffer: Optional[WriteBuffer] = None
 
     def __call__(
         self,
@@ -50,4 +85,35 @@ class SQLConnection:
             self._get_emoji,
             profiler=self.profiler,
             isolation_level=isolation_level,
+            ranked_emote_lookup=self.ranked_emote_lookup,
+            guild_settings_cache=self.guild_settings_cache,
+            blocked_emotes_index=self.blocked_emotes_index,
+            filtered_hashes=self.filtered_hashes,
+            emote_hash_cache=self.emote_hash_cache,
+            perceptual_index=self.perceptual_index,
+            guild_member_cache=self.guild_member_cache,
+            mutual_guilds_cache=self.mutual_guilds_cache,
+            lazy=self.lazy,
+            pool_metrics=self.pool_metrics,
+            stream_batch_size=self.stream_batch_size,
         )
+
+    def enable_write_buffer(
+        self,
+        *,
+        max_size: int = 1000,
+        flush_interval: float = 1.0,
+        metrics: Optional["WriteBufferMetrics"] = None,
+    ) -> WriteBuffer:
+        # Must be called with the event loop running
+        if self.write_buffer is None:
+            self.write_buffer = WriteBuffer(
+                self, max_size=max_size, flush_interval=flush_interval, metrics=metrics
+            )
+            self.write_buffer.start()
+        return self.write_buffer
+
+    async def close(self):
+        if self.write_buffer is not None:
+            await self.write_buffer.close()
+            self.write_buffer = None
@@ -15,6 +15,9 @@ SQLEmoji = namedtuple(
     ],
 )
 EmojiCounts = namedtuple("EmojiCounts", ["static", "animated"])
+EmoteGuildUpdate = namedtuple(
+    "EmoteGuildUpdate", ["emote_id", "guild_id", "usable", "has_roles", "name"]
+)
 
 
 class EmotePerceptualHashData(TypedDict):
@@ -0,0 +1,142 @@
+from array import array
+from itertools import compress
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
+
+from .emoji import SQLEmoji
+
+# Each boolean takes a value bit and a bit for NULL
+BOOL_FIELDS = ("usable", "animated", "has_roles")
+_VALUE_BITS = {name: 1 << i for i, name in enumerate(BOOL_FIELDS)}
+_NULL_BITS = {name: 1 << (i + len(BOOL_FIELDS)) for i, name in enumerate(BOOL_FIELDS)}
+# Hashes are nearly all distinct so they're packed end to end, names repeat a lot so they're interned
+PACKED_FIELDS = ("emote_hash", "emote_sha")
+
+# Stands in for NULL in guild_id
+_NULL = -(2**63)
+
+
+class _PackedStrings:
+    # Strings stored end to end in one buffer, with where each one ends
+    def __init__(self):
+        self.data = bytearray()
+        self.ends = array("Q")
+        self.nulls = array("B")
+
+    def __getitem__(self, i: int) -> Optional[str]:
+        if self.nulls[i]:
+            return None
+        start = self.ends[i - 1] if i else 0
+        return self.data[start : self.ends[i]].decode()
+
+    def append(self, string: Optional[str]):
+        if string is not None:
+            self.data += string.encode()
+        self.ends.append(len(self.data))
+        self.nulls.append(string is None)
+
+    def compress(self, selected: Sequence[bool]) -> "_PackedStrings":
+        packed = _PackedStrings()
+        for i in compress(range(len(self.ends)), selected):
+            packed.append(self[i])
+        return packed
+
+
+class EmojiColumns:
+    # SQLEmoji rows held as one typed array per column rather than a namedtuple per row.
+    # Rows are only built into SQLEmoji when indexed or iterated.
+    def __init__(self, names: Optional[List[Optional[str]]] = None):
+        self.emote_ids = array("q")
+        self.guild_ids = array("q")
+        self.flags = array("B")
+        self._packed = {name: _PackedStrings() for name in PACKED_FIELDS}
+        self._name_ids = array("I")
+        self._names: List[Optional[str]] = names if names is not None else []
+        self._name_index: Dict[Optional[str], int] = {
+            name: i for i, name in enumerate(self._names)
+        }
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Sequence]) -> "EmojiColumns":
+        columns = cls()
+        for row in rows:
+            columns.append(row)
+        return columns
+
+    def __len__(self) -> int:
+        return len(self.emote_ids)
+
+    def __iter__(self) -> Iterator[SQLEmoji]:
+        for i in range(len(self.emote_ids)):
+            yield self[i]
+
+    def __getitem__(self, i: int) -> SQLEmoji:
+        flags = self.flags[i]
+        bools = {
+            name: None if flags & _NULL_BITS[name] else bool(flags & _VALUE_BITS[name])
+            for name in BOOL_FIELDS
+        }
+        guild_id = self.guild_ids[i]
+        return SQLEmoji(
+            emote_id=self.emote_ids[i],
+            guild_id=None if guild_id == _NULL else guild_id,
+            name=self._names[self._name_ids[i]],
+            **bools,
+            **{name: column[i] for name, column in self._packed.items()},
+        )
+
+    def append(self, row: Sequence):
+        # row is in the same order as the fields of SQLEmoji
+        emote = SQLEmoji(*row)
+        flags = 0
+        for name in BOOL_FIELDS:
+            value = getattr(emote, name)
+            if value is None:
+                flags |= _NULL_BITS[name]
+            elif value:
+                flags |= _VALUE_BITS[name]
+        self.emote_ids.append(emote.emote_id)
+        self.guild_ids.append(_NULL if emote.guild_id is None else emote.guild_id)
+        self.flags.append(flags)
+        for name, column in self._packed.items():
+            column.append(getattr(emote, name))
+        self._name_ids.append(self._intern(emote.name))
+
+    def filter(
+        self,
+        *,
+        usable: Optional[bool] = None,
+        has_roles: Optional[bool] = None,
+        animated: Optional[bool] = None,
+    ) -> "EmojiColumns":
+        # Rows matching every flag given, a NULL flag never matches.
+        # The mask is worked out once from the flags column and applied to each column in turn.
+        mask = value = 0
+        for name, wanted in (
+            ("usable", usable),
+            ("has_roles", has_roles),
+            ("animated", animated),
+        ):
+            if wanted is None:
+                continue
+            mask |= _VALUE_BITS[name] | _NULL_BITS[name]
+            if wanted:
+                value |= _VALUE_BITS[name]
+        selected = [flags & mask == value for flags in self.flags]
+        filtered = EmojiColumns()
+        filtered.emote_ids = array("q", compress(self.emote_ids, selected))
+        filtered.guild_ids = array("q", compress(self.guild_ids, selected))
+        filtered.flags = array("B", compress(self.flags, selected))
+        filtered._packed = {
+            name: column.compress(selected) for name, column in self._packed.items()
+        }
+        # Names are interned again rather than shared, so appending to either doesn't touch the other
+        for name_id in compress(self._name_ids, selected):
+            filtered._name_ids.append(filtered._intern(self._names[name_id]))
+        return filtered
+
+    def _intern(self, name: Optional[str]) -> int:
+        i = self._name_index.get(name)
+        if i is None:
+            i = self._name_index[name] = len(self._names)
+            self._names.append(name)
+        return i
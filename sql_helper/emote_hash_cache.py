@@ -0,0 +1,29 @@
+from typing import Optional
+
+from .expiring_cache import ExpiringCache
+
+NOTIFY_CHANNEL = "emote_ids_hash"
+# Cached for emotes whose emote_hash is NULL, as get() returns None for ones it doesn't know
+NULL_HASH = object()
+
+
+class EmoteHashCache(ExpiringCache):
+    # emote_id to emote_hash. The re-hashing jobs run in other processes, so their writes
+    # notify NOTIFY_CHANNEL, and max_age covers any notification missed while not listening.
+    def __init__(self, maxsize: int = 100000, max_age: Optional[float] = 3600.0):
+        super().__init__(maxsize, max_age)
+
+    async def listen(self, pool):
+        # Long running. Drops an emote's hash whenever any process changes it, see EmojisMixin.
+        # Holds a pool connection while it runs.
+        async with pool.acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(f"LISTEN {NOTIFY_CHANNEL}")
+            # Anything cached before we started listening may have missed a notification
+            self.clear()
+            try:
+                while True:
+                    notification = await conn.notifies.get()
+                    self.pop(int(notification.payload))
+            finally:
+                self.clear()
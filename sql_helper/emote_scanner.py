@@ -0,0 +1,121 @@
+import asyncio
+from dataclasses import dataclass, field
+from typing import AsyncIterator, List, Optional, TYPE_CHECKING
+
+from .emoji import SQLEmoji
+
+if TYPE_CHECKING:
+    from .connection import SQLConnection
+
+
+@dataclass
+class ScanRange:
+    # Covers emote_id > start and emote_id <= end, start moves up as batches are handed out
+    start: int
+    end: int
+    done: bool = False
+
+
+@dataclass
+class ScanCheckpoint:
+    # Persist this to resume a scan. Batches are at least once, one that was handed out but
+    # not yet followed by another may be handed out again.
+    ranges: List[ScanRange] = field(default_factory=list)
+
+    @property
+    def done(self) -> bool:
+        return bool(self.ranges) and all(scan_range.done for scan_range in self.ranges)
+
+
+class EmoteScanner:
+    # Walks emote_ids split into ranges, fetching pages for up to concurrency ranges at once,
+    # each page on its own pooled connection. Ordered yields batches in emote_id order.
+    def __init__(
+        self,
+        sql: "SQLConnection",
+        *,
+        ranges: int = 8,
+        concurrency: int = 4,
+        batch_size: int = 1000,
+        ordered: bool = False,
+        checkpoint: Optional[ScanCheckpoint] = None,
+    ):
+        self.sql = sql
+        self.ranges = ranges
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.ordered = ordered
+        self.checkpoint = checkpoint or ScanCheckpoint()
+
+    def __aiter__(self) -> AsyncIterator[List[SQLEmoji]]:
+        return self.scan()
+
+    async def scan(self) -> AsyncIterator[List[SQLEmoji]]:
+        if not self.checkpoint.ranges:
+            async with self.sql() as conn:
+                min_id, max_id = await conn.emote_id_bounds()
+            if min_id is None:
+                return
+            self.checkpoint.ranges = _split(min_id - 1, max_id, self.ranges)
+        pending = [
+            scan_range for scan_range in self.checkpoint.ranges if not scan_range.done
+        ]
+        semaphore = asyncio.Semaphore(self.concurrency)
+        if self.ordered:
+            # Later ranges only get a couple of pages ahead while the earlier ones are handed out
+            groups = [(asyncio.Queue(2), 1) for _ in pending]
+            queues = [queue for queue, _ in groups]
+        else:
+            queue = asyncio.Queue(self.concurrency * 2)
+            groups = [(queue, len(pending))]
+            queues = [queue] * len(pending)
+        tasks = [
+            asyncio.create_task(self._scan_range(scan_range, queue, semaphore))
+            for scan_range, queue in zip(pending, queues)
+        ]
+        try:
+            for queue, remaining in groups:
+                while remaining:
+                    scan_range, batch = await queue.get()
+                    if isinstance(batch, Exception):
+                        raise batch
+                    if batch is None:
+                        scan_range.done = True
+                        remaining -= 1
+                        continue
+                    yield batch
+                    scan_range.start = batch[-1].emote_id
+        finally:
+            for task in tasks:
+                task.cancel()
+            # Wait for them to unwind so no connection is still held once the scan returns
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _scan_range(
+        self, scan_range: ScanRange, queue: asyncio.Queue, semaphore: asyncio.Semaphore
+    ):
+        start = scan_range.start
+        try:
+            while True:
+                # Only held for the fetch, a worker waiting on a full queue mustn't block the others
+                async with semaphore:
+                    async with self.sql() as conn:
+                        batch = await conn.get_emotes_in_range(
+                            start, scan_range.end, self.batch_size
+                        )
+                if batch:
+                    await queue.put((scan_range, batch))
+                    start = batch[-1].emote_id
+                if len(batch) < self.batch_size:
+                    break
+        except Exception as e:
+            await queue.put((scan_range, e))
+            return
+        await queue.put((scan_range, None))
+
+
+def _split(start: int, end: int, count: int) -> List[ScanRange]:
+    span = end - start
+    count = max(1, min(count, span))
+    bounds = [start + span * i // count for i in range(count + 1)]
+    return [ScanRange(bounds[i], bounds[i + 1]) for i in range(count)]
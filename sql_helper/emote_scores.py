@@ -0,0 +1,24 @@
+import random
+from typing import Callable
+
+MAX_SCORE = 127
+MIN_SCORE = -128
+
+
+def increment_probability(score: int) -> float:
+    # The chance increment_guild_emote_score bumps a score, trunc(random() * (2<<((score>>5)+3))) = 0.
+    # Scores below -96 shift by -1, which Postgres turns into 0 and so always increments.
+    shift = (score >> 5) + 3
+    if shift < 0:
+        return 1.0
+    return 1 / (2 << shift)
+
+
+def apply_uses(score: int, uses: int, rand: Callable[[], float] = random.random) -> int:
+    # The score after increment_guild_emote_score is called once per use
+    for _ in range(uses):
+        if score >= MAX_SCORE:
+            break
+        if rand() < increment_probability(score):
+            score += 1
+    return score
@@ -0,0 +1,57 @@
+import time
+from typing import Any, Dict, Hashable, Optional
+
+from .lru_cache import LRUCache
+
+
+class ExpiringCache:
+    # An LRUCache whose entries expire after max_age seconds, which bounds how stale writes from
+    # other processes can leave it. Take generation() before reading from the database and pass it
+    # to set, which then skips the value if its key was popped in between.
+    def __init__(self, maxsize: int, max_age: Optional[float] = None):
+        self.max_age = max_age
+        self._cache = LRUCache(maxsize)
+        self._clock = 0
+        # When each recently popped key was popped. Older pops are forgotten into _floor,
+        # which every key without an entry is assumed to have been popped at.
+        self._popped: Dict[Hashable, int] = {}
+        self._floor = 0
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key) is not None
+
+    def generation(self) -> int:
+        return self._clock
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        cached = self._cache.get(key)
+        if cached is None:
+            return default
+        stored_at, value = cached
+        if self.max_age is not None and time.monotonic() - stored_at > self.max_age:
+            self._cache.pop(key)
+            return default
+        return value
+
+    def set(self, key: Hashable, value: Any, generation: Optional[int] = None):
+        if generation is not None and self._popped.get(key, self._floor) > generation:
+            return
+        self._cache.set(key, (time.monotonic(), value))
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        self._clock += 1
+        self._popped.pop(key, None)
+        self._popped[key] = self._clock
+        if len(self._popped) > self._cache.maxsize:
+            self._floor = self._popped.pop(next(iter(self._popped)))
+        cached = self._cache.pop(key)
+        return default if cached is None else cached[1]
+
+    def clear(self):
+        self._clock += 1
+        self._floor = self._clock
+        self._popped.clear()
+        self._cache.clear()
@@ -0,0 +1,115 @@
+from hashlib import blake2b
+from math import ceil, log
+from typing import Iterable, Iterator, Optional, Set, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from prometheus_client import Counter
+
+NOTIFY_CHANNEL = "emote_hashes"
+
+
+class BloomFilter:
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(8, ceil(-capacity * log(error_rate) / log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key: str) -> Iterator[int]:
+        # Double hashing, both halves from one digest
+        digest = blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.hash_count):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, key: str):
+        for position in self._positions(key):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key: str) -> bool:
+        return all(
+            self._bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(key)
+        )
+
+
+class FilteredHashes:
+    # Every filtered emote hash, so EmojiHashesMixin doesn't have to ask emote_hashes.
+    # Almost nothing is filtered, so most lookups stop at the bloom filter.
+    def __init__(
+        self,
+        capacity: int = 10000,
+        error_rate: float = 0.01,
+        metric: Optional["Counter"] = None,
+    ):
+        self.loaded = False
+        self.metric = metric
+        self._hashes: Set[str] = set()
+        self._bloom = BloomFilter(capacity, error_rate)
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+    def __contains__(self, emote_hash: Optional[str]) -> bool:
+        if emote_hash is None or emote_hash not in self._bloom:
+            self._observe("miss")
+            return False
+        if emote_hash in self._hashes:
+            self._observe("hit")
+            return True
+        self._observe("false_positive")
+        return False
+
+    def load(self, emote_hashes: Iterable[str]):
+        self._hashes = set()
+        self._bloom = BloomFilter(self._bloom.capacity, self._bloom.error_rate)
+        self.update(emote_hashes)
+        self.loaded = True
+
+    def update(self, emote_hashes: Iterable[str]):
+        for emote_hash in emote_hashes:
+            self.add(emote_hash)
+
+    def add(self, emote_hash: str):
+        if emote_hash in self._hashes:
+            return
+        self._hashes.add(emote_hash)
+        if len(self._hashes) > self._bloom.capacity:
+            # Past capacity the false positive rate climbs, so start again with room to grow
+            self._bloom = BloomFilter(self._bloom.capacity * 2, self._bloom.error_rate)
+            for i in self._hashes:
+                self._bloom.add(i)
+        else:
+            self._bloom.add(emote_hash)
+
+    def _observe(self, result: str):
+        if self.metric is not None:
+            self.metric.labels(result=result).inc()
+
+    async def listen(self, pool, batch_size: int = 10000):
+        # Long running. Loads every filtered hash, then adds any that are marked filtered by any process
+        async with pool.acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(f"LISTEN {NOTIFY_CHANNEL}")
+                # Not loaded until the last page, a partial set would report filtered hashes as unfiltered
+                emote_hashes = []
+                last_hash = ""
+                while True:
+                    await cur.execute(
+                        "SELECT emote_hash FROM emote_hashes WHERE filtered=true and emote_hash>%(last_hash)s ORDER BY emote_hash LIMIT %(limit)s",
+                        parameters={"last_hash": last_hash, "limit": batch_size},
+                    )
+                    results = await cur.fetchall()
+                    emote_hashes.extend(emote_hash for emote_hash, in results)
+                    if len(results) < batch_size:
+                        break
+                    last_hash = results[-1][0]
+                self.load(emote_hashes)
+            try:
+                while True:
+                    notification = await conn.notifies.get()
+                    self.add(notification.payload)
+            finally:
+                self.loaded = False
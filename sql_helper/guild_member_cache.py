@@ -0,0 +1,20 @@
+from array import array
+from typing import Iterable, Optional
+
+from .expiring_cache import ExpiringCache
+
+
+class GuildMemberCache(ExpiringCache):
+    # Each guild's user_ids as one array, for sampling members without going back to the database.
+    # Writes through this process invalidate a guild, max_age bounds how stale other processes' writes leave it.
+    # Generations are tracked per guild, so a write to one guild doesn't throw away a load of another.
+    def __init__(self, maxsize: int = 1000, max_age: Optional[float] = 300.0):
+        super().__init__(maxsize, max_age)
+
+    def set(self, guild_id: int, user_ids: Iterable[int], generation: int) -> array:
+        members = array("q", user_ids)
+        super().set(guild_id, members, generation)
+        return members
+
+    def invalidate(self, guild_id: int):
+        self.pop(guild_id)
@@ -1,3 +1,4 @@
+from typing import List, Optional
 from dataclasses import dataclass
 
 
@@ -7,3 +8,11 @@ class GuildMessage:
     channel_id: int
     message_id: int
     user_id: int
+
+
+@dataclass()
+class GuildMessagePage:
+    # Newest first. before and after are cursors for the older and newer pages, if there are any
+    messages: List[GuildMessage]
+    before: Optional[str] = None
+    after: Optional[str] = None
@@ -13,6 +13,8 @@ class SettingsFlags(Flag):
     personas = auto()
     dashboard_posting = auto()
     phish_detection = auto()
+    emoji_search = auto()
+    sticker_search = auto()
 
 
 DEFAULTS = (
@@ -23,6 +25,8 @@ DEFAULTS = (
     | SettingsFlags.user_content
     | SettingsFlags.dashboard_posting
     | SettingsFlags.phish_detection
+    | SettingsFlags.emoji_search
+    | SettingsFlags.sticker_search
 )
 
 
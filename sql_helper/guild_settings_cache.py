@@ -0,0 +1,45 @@
+from dataclasses import replace
+from typing import Optional
+
+from .expiring_cache import ExpiringCache
+from .guild_settings import GuildSettings
+
+NOTIFY_CHANNEL = "guild_settings"
+MISSING = object()
+
+
+class GuildSettingsCache(ExpiringCache):
+    # Take generation() before reading settings and pass it to set, so a read that raced a write doesn't cache
+    # stale settings. Generations are per guild, and only the most recent maxsize invalidations are remembered.
+    def __init__(self, maxsize: int = 10000):
+        super().__init__(maxsize)
+
+    def get(self, guild_id: int):
+        # Returns MISSING if we don't know, None if the guild has no settings stored
+        settings = super().get(guild_id, MISSING)
+        if settings is None or settings is MISSING:
+            return settings
+        # GuildSettings is mutable, so don't hand out the cached copy
+        return replace(settings)
+
+    def set(self, guild_id: int, settings: Optional[GuildSettings], generation: int):
+        super().set(guild_id, settings and replace(settings), generation)
+
+    def invalidate(self, guild_id: int):
+        self.pop(guild_id)
+
+    async def listen(self, pool):
+        # Long running. Drops cached settings whenever any process writes them, see GuildSettingsMixin.
+        # Holds one of the pool's connections for as long as it runs, so size the pool for it
+        # or pass a pool of its own.
+        async with pool.acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(f"LISTEN {NOTIFY_CHANNEL}")
+            # Anything cached before we started listening may have missed a notification
+            self.clear()
+            try:
+                while True:
+                    notification = await conn.notifies.get()
+                    self.invalidate(int(notification.payload))
+            finally:
+                self.clear()
@@ -0,0 +1,128 @@
+from array import array
+from dataclasses import fields
+from typing import Dict, Iterator, List, Optional, Sequence
+
+from .guild_settings import GuildSettings, SettingsFlags
+
+FLAG_FIELDS = {
+    "enable_stickers": SettingsFlags.stickers,
+    "enable_nitro": SettingsFlags.nitro,
+    "enable_replies": SettingsFlags.replies,
+    "is_alias_server": SettingsFlags.alias_server,
+    "enable_pings": SettingsFlags.pings,
+    "enable_user_content": SettingsFlags.user_content,
+    "enable_personas": SettingsFlags.personas,
+    "enable_dashboard_posting": SettingsFlags.dashboard_posting,
+    "enable_phish_detection": SettingsFlags.phish_detection,
+    "enable_emoji_search": SettingsFlags.emoji_search,
+    "enable_sticker_search": SettingsFlags.sticker_search,
+}
+INT_FIELDS = (
+    "max_guildwide_emotes",
+    "nitro_role",
+    "boost_channel",
+    "boost_role",
+    "audit_channel",
+)
+STR_FIELDS = ("prefix", "locale")
+FIELD_NAMES = [field.name for field in fields(GuildSettings)]
+
+# Stands in for NULL in the integer columns
+_NULL = -(2**63)
+
+
+class GuildSettingsStore:
+    # Every guild's settings as one typed array per column rather than one GuildSettings per guild.
+    # Booleans are packed into SettingsFlags bits and strings are interned, since most guilds share them.
+    def __init__(self):
+        self._index: Dict[int, int] = {}
+        self._guild_ids = array("q")
+        self._flags = array("H")
+        self._ints = {name: array("q") for name in INT_FIELDS}
+        self._strs = {name: array("I") for name in STR_FIELDS}
+        self._strings: List[Optional[str]] = []
+        self._string_ids: Dict[Optional[str], int] = {}
+
+    def __len__(self) -> int:
+        return len(self._guild_ids)
+
+    def __contains__(self, guild_id: int) -> bool:
+        return guild_id in self._index
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self._guild_ids)
+
+    def add(self, settings: GuildSettings):
+        self.add_row([getattr(settings, name) for name in FIELD_NAMES])
+
+    def add_row(self, row: Sequence):
+        # row is in the same order as the fields of GuildSettings
+        values = dict(zip(FIELD_NAMES, row))
+        guild_id = values["guild_id"]
+        flags = SettingsFlags(0)
+        for name, flag in FLAG_FIELDS.items():
+            if values[name]:
+                flags |= flag
+        i = self._index.get(guild_id)
+        if i is None:
+            self._index[guild_id] = len(self._guild_ids)
+            self._guild_ids.append(guild_id)
+            self._flags.append(flags.value)
+            for name, column in self._ints.items():
+                column.append(_NULL if values[name] is None else values[name])
+            for name, column in self._strs.items():
+                column.append(self._intern(values[name]))
+        else:
+            self._flags[i] = flags.value
+            for name, column in self._ints.items():
+                column[i] = _NULL if values[name] is None else values[name]
+            for name, column in self._strs.items():
+                column[i] = self._intern(values[name])
+
+    def discard(self, guild_id: int):
+        i = self._index.pop(guild_id, None)
+        if i is None:
+            return
+        # Keep the columns dense by moving the last guild into the gap
+        last = len(self._guild_ids) - 1
+        columns = [self._guild_ids, self._flags, *self._ints.values()]
+        columns += self._strs.values()
+        if i != last:
+            for column in columns:
+                column[i] = column[last]
+            self._index[self._guild_ids[i]] = i
+        for column in columns:
+            column.pop()
+
+    def get(self, guild_id: int) -> Optional[GuildSettings]:
+        i = self._index.get(guild_id)
+        if i is None:
+            return None
+        flags = SettingsFlags(self._flags[i])
+        values = {"guild_id": guild_id}
+        for name, flag in FLAG_FIELDS.items():
+            values[name] = flag in flags
+        for name, column in self._ints.items():
+            values[name] = None if column[i] == _NULL else column[i]
+        for name, column in self._strs.items():
+            values[name] = self._strings[column[i]]
+        return GuildSettings(**values)
+
+    def flags(self, guild_id: int) -> Optional[SettingsFlags]:
+        i = self._index.get(guild_id)
+        if i is None:
+            return None
+        return SettingsFlags(self._flags[i])
+
+    def prefix(self, guild_id: int) -> Optional[str]:
+        i = self._index.get(guild_id)
+        if i is None:
+            return None
+        return self._strings[self._strs["prefix"][i]]
+
+    def _intern(self, string: Optional[str]) -> int:
+        i = self._string_ids.get(string)
+        if i is None:
+            i = self._string_ids[string] = len(self._strings)
+            self._strings.append(string)
+        return i
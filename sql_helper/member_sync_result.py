@@ -0,0 +1,3 @@
+from collections import namedtuple
+
+MemberSyncResult = namedtuple("MemberSyncResult", ["added", "removed"])
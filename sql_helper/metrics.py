@@ -1,5 +1,5 @@
 import time
-from prometheus_client import Histogram
+from prometheus_client import Counter, Gauge, Histogram, REGISTRY
 from sentry_sdk import add_breadcrumb, start_span
 
 
@@ -35,3 +35,96 @@ def sql_wrapper(namespace: str):
         return execute_wrapper
 
     return middle
+
+
+def filtered_hashes_counter(namespace: str) -> Counter:
+    return Counter(
+        "filtered_hashes_lookups",
+        "Filtered emote hash lookups answered in memory",
+        ["result"],
+        namespace=namespace,
+    )
+
+
+class PoolMetrics:
+    def __init__(self, namespace: str, registry=REGISTRY):
+        self.acquire_wait = Histogram(
+            "sql_pool_acquire_seconds",
+            "Time spent waiting for a pool connection",
+            ["isolation_level", "method"],
+            namespace=namespace,
+            registry=registry,
+        )
+        self.hold = Histogram(
+            "sql_pool_hold_seconds",
+            "Time a pool connection was checked out for",
+            ["isolation_level", "method"],
+            namespace=namespace,
+            registry=registry,
+        )
+        self.query = Histogram(
+            "sql_query_seconds",
+            "Time each query took",
+            ["isolation_level", "method"],
+            namespace=namespace,
+            registry=registry,
+        )
+        self.size = Gauge(
+            "sql_pool_size",
+            "Open pool connections",
+            namespace=namespace,
+            registry=registry,
+        )
+        self.free = Gauge(
+            "sql_pool_free",
+            "Idle pool connections",
+            namespace=namespace,
+            registry=registry,
+        )
+        self.in_use = Gauge(
+            "sql_pool_in_use",
+            "Checked out pool connections",
+            namespace=namespace,
+            registry=registry,
+        )
+
+    def observe(self, isolation_level, method: str, wait: float, hold: float):
+        isolation_level = isolation_level.name if isolation_level else "default"
+        self.acquire_wait.labels(
+            isolation_level=isolation_level, method=method
+        ).observe(wait)
+        self.hold.labels(isolation_level=isolation_level, method=method).observe(hold)
+
+    def observe_query(self, isolation_level, method: str, duration: float):
+        isolation_level = isolation_level.name if isolation_level else "default"
+        self.query.labels(isolation_level=isolation_level, method=method).observe(
+            duration
+        )
+
+    def update_pool(self, pool):
+        self.size.set(pool.size)
+        self.free.set(pool.freesize)
+        self.in_use.set(pool.size - pool.freesize)
+
+
+class WriteBufferMetrics:
+    def __init__(self, namespace: str, registry=REGISTRY):
+        self.depth = Gauge(
+            "write_buffer_depth",
+            "Writes waiting in the write buffer",
+            namespace=namespace,
+            registry=registry,
+        )
+        self.flush = Histogram(
+            "write_buffer_flush_seconds",
+            "Time taken to flush the write buffer",
+            namespace=namespace,
+            registry=registry,
+        )
+        self.dropped = Counter(
+            "write_buffer_dropped_rows",
+            "Rows the write buffer gave up on after failing to flush them",
+            ["method"],
+            namespace=namespace,
+            registry=registry,
+        )
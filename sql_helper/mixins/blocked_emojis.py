@@ -3,6 +3,7 @@ from enum import Enum, auto
 
 from discord import PartialEmoji
 
+from ..blocked_emotes_index import NOTIFY_CHANNEL
 from .._connection import _PostgresConnection
 from .aliases import _get_emotes
 
@@ -21,7 +22,34 @@ class BlockedEmojisMixin(_PostgresConnection):
         results = await self.cur.fetchall()
         return [guild_id for guild_id, in results]
 
+    async def load_blocked_emotes_index(self, guild_ids: Optional[List[int]] = None):
+        # Loads every guild's blocks into blocked_emotes_index, or reloads just the given guilds.
+        # Does nothing without a blocked_emotes_index.
+        index = self.blocked_emotes_index
+        if index is None:
+            return
+        if guild_ids is None:
+            await self.cur.execute(
+                "SELECT guild_id, emote_id, emote_hash FROM blocked_emotes",
+                parameters={},
+            )
+            index.load(await self.cur.fetchall())
+        else:
+            await self.cur.execute(
+                "SELECT guild_id, emote_id, emote_hash FROM blocked_emotes WHERE guild_id=ANY(%(guild_ids)s)",
+                parameters={"guild_ids": guild_ids},
+            )
+            index.refresh(guild_ids, await self.cur.fetchall())
+
     async def has_blocked_emotes(self, guild_id: int, emote_ids: List[int]) -> bool:
+        index = self.blocked_emotes_index
+        if index is not None and index.loaded:
+            if not index.has_blocks(guild_id):
+                return False
+            if index.blocked_ids(guild_id, emote_ids):
+                return True
+            emote_hashes = await self._get_emote_hashes_by_id(emote_ids)
+            return bool(index.blocked_hashes(guild_id, emote_hashes))
         await self.cur.execute(
             """     
 select
@@ -35,6 +63,17 @@ select
         return results[0][0]
 
     async def emotes_blocked(self, guild_id: int, emote_ids: List[int]) -> List[int]:
+        index = self.blocked_emotes_index
+        if index is not None and index.loaded:
+            if not index.has_blocks(guild_id):
+                return []
+            emote_hashes = await self._get_emote_hashes_by_id(emote_ids)
+            return list(
+                {
+                    *index.blocked_ids(guild_id, emote_ids),
+                    *index.blocked_hashes(guild_id, emote_hashes),
+                }
+            )
         await self.cur.execute(
             """
 with guild_blocks as (
@@ -62,7 +101,7 @@ union
 
         await self.cur.execute(
             """
-INSERT INTO blocked_emotes (guild_id, emote_id, name, animated, emote_hash) select guild_id, a.emote_id, "name", animated, emote_hash from ((select
+WITH inserted AS (INSERT INTO blocked_emotes (guild_id, emote_id, name, animated, emote_hash) select guild_id, a.emote_id, "name", animated, emote_hash from ((select
         %(guild_id)s as guild_id,
         unnest(%(emote_ids)s) as emote_id,
         unnest(%(names)s) as "name",
@@ -71,15 +110,20 @@ INSERT INTO blocked_emotes (guild_id, emote_id, name, animated, emote_hash) sele
     join
     (select gids.emote_id, emote_hash from (SELECT * from unnest(%(emote_ids)s) as emote_id) gids left join emote_ids on emote_ids.emote_id=gids.emote_id) b
     on a.emote_id = b.emote_id
-) ON CONFLICT DO NOTHING
+) ON CONFLICT DO NOTHING RETURNING guild_id, emote_id, emote_hash)
+SELECT guild_id, emote_id, emote_hash, pg_notify(%(channel)s, guild_id::text) FROM inserted
             """,
             parameters={
                 "guild_id": guild_id,
                 "names": names,
                 "emote_ids": ids,
                 "animateds": animateds,
+                "channel": NOTIFY_CHANNEL,
             },
         )
+        if self.blocked_emotes_index is not None:
+            for guild_id, emote_id, emote_hash, _ in await self.cur.fetchall():
+                self.blocked_emotes_index.add(guild_id, emote_id, emote_hash)
 
     async def get_blocked_emotes(self, guild_id: int) -> List[PartialEmoji]:
         await self.cur.execute(
@@ -139,9 +183,19 @@ INSERT INTO blocked_emotes (guild_id, emote_id, name, animated, emote_hash) sele
     async def unblock_emote(self, guild_id: int, emote_id: int) -> bool:
         # Returns if the guild still has blocked emotes
         await self.cur.execute(
-            "delete from blocked_emotes where guild_id=%(guild_id)s and emote_id=%(emote_id)s",
-            parameters={"guild_id": guild_id, "emote_id": emote_id},
+            "with deleted as (delete from blocked_emotes where guild_id=%(guild_id)s and emote_id=%(emote_id)s returning guild_id) "
+            "select pg_notify(%(channel)s, guild_id::text) from deleted",
+            parameters={
+                "guild_id": guild_id,
+                "emote_id": emote_id,
+                "channel": NOTIFY_CHANNEL,
+            },
         )
+        index = self.blocked_emotes_index
+        if index is not None:
+            index.remove(guild_id, emote_id)
+            if index.loaded:
+                return index.has_blocks(guild_id)
         await self.cur.execute(
             "select exists(select emote_id from blocked_emotes where guild_id = %(guild_id)s)",
             parameters={"guild_id": guild_id},
@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import List, Optional, Tuple
 from .._connection import _PostgresConnection
 
 
@@ -9,6 +9,18 @@ class CommandMessagesMixin(_PostgresConnection):
             parameters={"message_id": message_id, "user_id": user_id},
         )
 
+    async def add_command_messages_bulk(self, messages: List[Tuple[int, int]]):
+        # messages are (message_id, user_id)
+        if not messages:
+            return
+        await self.cur.execute(
+            "INSERT INTO command_messages (message_id, user_id) SELECT * FROM unnest(%(message_ids)s::bigint[], %(user_ids)s::bigint[])",
+            parameters={
+                "message_ids": [message_id for message_id, _ in messages],
+                "user_ids": [user_id for _, user_id in messages],
+            },
+        )
+
     async def get_command_message_author(self, message_id: int) -> Optional[int]:
         await self.cur.execute(
             "SELECT user_id FROM command_messages WHERE message_id=%(message_id)s LIMIT 1",
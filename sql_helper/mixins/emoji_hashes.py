@@ -1,10 +1,13 @@
 from typing import List, Set
 
+from ..filtered_hashes import NOTIFY_CHANNEL
 from .._connection import _PostgresConnection
 
 
 class EmojiHashesMixin(_PostgresConnection):
     async def is_emote_hash_filtered(self, emote_hash: str) -> bool:
+        if self._filtered_hashes_loaded():
+            return emote_hash in self.filtered_hashes
         await self.cur.execute(
             "SELECT 1 FROM emote_hashes WHERE emote_hash=%(emote_hash)s and filtered=true LIMIT 1",
             parameters={"emote_hash": emote_hash},
@@ -13,6 +16,12 @@ class EmojiHashesMixin(_PostgresConnection):
         return bool(results)
 
     async def get_all_emote_hashes_filtered(self, emote_hashes: List[str]) -> Set[str]:
+        if self._filtered_hashes_loaded():
+            return {
+                emote_hash
+                for emote_hash in emote_hashes
+                if emote_hash in self.filtered_hashes
+            }
         await self.cur.execute(
             "SELECT emote_hash FROM emote_hashes WHERE emote_hash=ANY(%(emote_hashes)s) and filtered=true",
             parameters={"emote_hashes": emote_hashes},
@@ -21,6 +30,15 @@ class EmojiHashesMixin(_PostgresConnection):
         return set(hash for hash, in results)
 
     async def get_emote_ids_globally_filtered(self, emote_ids: List[int]) -> Set[int]:
+        if self._filtered_hashes_loaded():
+            if not self.filtered_hashes:
+                return set()
+            emote_hashes = await self._get_emote_hashes_by_id(emote_ids)
+            return {
+                emote_id
+                for emote_id, emote_hash in emote_hashes.items()
+                if emote_hash in self.filtered_hashes
+            }
         await self.cur.execute(
             "select emote_id from emote_ids where emote_id=ANY(%(emote_ids)s) and emote_hash in (select emote_hash from emote_hashes where filtered=true)",
             parameters={"emote_ids": emote_ids},
@@ -29,7 +47,14 @@ class EmojiHashesMixin(_PostgresConnection):
         return set(emote_id for emote_id, in results)
 
     async def mark_emote_hash_filtered(self, emote_hash: str):
+        # Notifies NOTIFY_CHANNEL so every process's FilteredHashes picks it up
         await self.cur.execute(
-            "INSERT INTO emote_hashes (emote_hash, filtered) VALUES (%(emote_hash)s, true)",
-            parameters={"emote_hash": emote_hash},
+            "WITH inserted AS (INSERT INTO emote_hashes (emote_hash, filtered) VALUES (%(emote_hash)s, true) RETURNING emote_hash) "
+            "SELECT pg_notify(%(channel)s, emote_hash) FROM inserted",
+            parameters={"emote_hash": emote_hash, "channel": NOTIFY_CHANNEL},
         )
+        if self.filtered_hashes is not None:
+            self.filtered_hashes.add(emote_hash)
+
+    def _filtered_hashes_loaded(self) -> bool:
+        return self.filtered_hashes is not None and self.filtered_hashes.loaded
@@ -1,13 +1,37 @@
-from typing import Dict, Optional, List, Set, Tuple
+from typing import Dict, Optional, List, Set, Tuple, Union
 from collections import Counter
+from enum import Enum
 from discord import Emoji
-from ..emoji import SQLEmoji, EmojiCounts, EmotePerceptualHashData
+from ..emoji import SQLEmoji, EmojiCounts, EmotePerceptualHashData, EmoteGuildUpdate
+from ..emoji_columns import EmojiColumns
+from ..emote_hash_cache import NOTIFY_CHANNEL as EMOTE_HASH_CHANNEL
+from ..emote_scores import apply_uses
 
 from .._connection import _PostgresConnection
 
 
+class EmoteScope(Enum):
+    guild = 1
+    mutual = 2
+    packs = 3
+    pack = 4
+
+
+_SCOPE_WHERE = {
+    EmoteScope.guild: "guild_id=%(scope)s",
+    EmoteScope.mutual: "guild_id in (select guild_id from members where user_id=%(scope)s)",
+    EmoteScope.packs: "guild_id in (select guild_id from user_packs where user_id=%(scope)s)",
+    EmoteScope.pack: "guild_id=(select guild_id from packs where pack_name=%(scope)s)",
+}
+
+
 class EmojisMixin(_PostgresConnection):
     async def get_emote_hashes(self, emote_ids: List[int]) -> Dict[str, int]:
+        if self.emote_hash_cache is not None:
+            emote_hashes = await self._get_emote_hashes_by_id(emote_ids, keep_null=True)
+            return {
+                emote_hash: emote_id for emote_id, emote_hash in emote_hashes.items()
+            }
         if not emote_ids:
             return {}
         await self.cur.execute(
@@ -18,13 +42,8 @@ class EmojisMixin(_PostgresConnection):
         return {emote_hash: emote_id for emote_id, emote_hash in emote_hashes}
 
     async def get_emote_hash(self, emote_id: int) -> Optional[str]:
-        await self.cur.execute(
-            "SELECT emote_hash FROM emote_ids WHERE emote_id=%(emote_id)s",
-            parameters={"emote_id": emote_id},
-        )
-        emote_hash = await self.cur.fetchall()
-        if emote_hash and emote_hash[0][0]:
-            return emote_hash[0][0]
+        emote_hashes = await self._get_emote_hashes_by_id([emote_id])
+        return emote_hashes.get(emote_id) or None
 
     async def get_synonyms_for_emote(
         self, emote_hash: str, limit: Optional[int] = 10
@@ -44,6 +63,14 @@ class EmojisMixin(_PostgresConnection):
         return [emote_id for emote_id, in results]
 
     async def alternative_emote_names(self, emote_id: int) -> List[str]:
+        emote_hash = self._cached_emote_hash(emote_id)
+        if emote_hash is not None:
+            await self.cur.execute(
+                """select trim("name") as name from (select "name", count(*) from emote_ids where emote_hash=%(emote_hash)s group by "name" order by count desc) a where count > 10 and lower("name") not like 'emoji%%' limit 10""",
+                parameters={"emote_hash": emote_hash},
+            )
+            results = await self.cur.fetchall()
+            return [name for name, in results]
         await self.cur.execute(
             """select trim("name") as name from (select "name", count(*) from emote_ids where emote_hash=(select emote_hash from emote_ids where emote_id=%(emote_id)s) group by "name" order by count desc) a where count > 10 and lower("name") not like 'emoji%%' limit 10""",
             parameters={"emote_id": emote_id},
@@ -74,13 +101,41 @@ class EmojisMixin(_PostgresConnection):
         )
         results = await self.cur.fetchall()
         if results:
+            # Notifies EMOTE_HASH_CHANNEL so every process's EmoteHashCache drops them
             await self.cur.execute(
-                "DELETE FROM emote_ids WHERE emote_id=ANY(%(emote_ids)s) and guild_id is NULL",
-                parameters={"emote_ids": emote_ids},
+                "WITH deleted AS (DELETE FROM emote_ids WHERE emote_id=ANY(%(emote_ids)s) and guild_id is NULL RETURNING emote_id) "
+                "SELECT pg_notify(%(channel)s, emote_id::text) FROM deleted",
+                parameters={"emote_ids": emote_ids, "channel": EMOTE_HASH_CHANNEL},
             )
-        return set(emote_id for emote_id, in results)
+        purged = set(emote_id for emote_id, in results)
+        if self.emote_hash_cache is not None:
+            for emote_id in purged:
+                self.emote_hash_cache.pop(emote_id)
+        if self.perceptual_index is not None:
+            for emote_id in purged:
+                self.perceptual_index.remove(emote_id)
+        return purged
+
+    async def near_duplicate_emote_ids(
+        self, emote_id: int, max_distance: int
+    ) -> List[Tuple[int, int]]:
+        # (emote_id, distance) of emotes whose emote_hash is within max_distance bits, needs a loaded perceptual_index
+        if self.perceptual_index is None or not self.perceptual_index.loaded:
+            return []
+        emote_hash = await self.get_emote_hash(emote_id)
+        if emote_hash is None:
+            return []
+        return [
+            result
+            for result in self.perceptual_index.search(emote_hash, max_distance)
+            if result[0] != emote_id
+        ]
 
     async def share_hashes(self, emote_id_1: int, emote_id_2: int) -> bool:
+        if self.emote_hash_cache is not None:
+            emote_hashes = await self._get_emote_hashes_by_id([emote_id_1, emote_id_2])
+            emote_hash = emote_hashes.get(emote_id_1)
+            return emote_hash is not None and emote_hash == emote_hashes.get(emote_id_2)
         await self.cur.execute(
             "select 1 from emote_ids where emote_hash=(select emote_hash from emote_ids where emote_id = %(emote_id_1)s) and emote_id = %(emote_id_2)s LIMIT 1",
             parameters={"emote_id_1": emote_id_1, "emote_id_2": emote_id_2},
@@ -132,6 +187,53 @@ class EmojisMixin(_PostgresConnection):
         if results:
             return SQLEmoji(*results[0])
 
+    async def get_emotes_like(
+        self, emote_ids: List[int], *, require_guild: bool = True
+    ) -> Dict[int, Optional[Emoji]]:
+        # Bulk counterpart of get_emote_like
+        if not emote_ids:
+            return {}
+        await self.cur.execute(
+            "SELECT emote_id, emote_hash, usable, animated, emote_sha, guild_id, trim(name), has_roles FROM emote_ids WHERE emote_id=ANY(%(emote_ids)s)",
+            parameters={"emote_ids": emote_ids},
+        )
+        results = await self.cur.fetchall()
+        rtn = dict.fromkeys(emote_ids)
+        unusable = []
+        for emote in (SQLEmoji(*i) for i in results):
+            if emote.usable and (emote.guild_id or not require_guild):
+                rtn[emote.emote_id] = self._get_emoji(emote)
+            else:
+                unusable.append(emote)
+        if unusable:
+            copies = await self._get_emotes_like(
+                [emote.emote_hash for emote in unusable], require_guild
+            )
+            for emote in unusable:
+                rtn[emote.emote_id] = self._sql_emoji_to_emoji(
+                    copies.get(emote.emote_hash)
+                )
+        return rtn
+
+    async def _get_emotes_like(
+        self, emote_hashes: List[Optional[str]], require_guild: bool
+    ) -> Dict[str, SQLEmoji]:
+        emote_hashes = list({emote_hash for emote_hash in emote_hashes if emote_hash})
+        if not emote_hashes:
+            return {}
+        if require_guild:
+            await self.cur.execute(
+                "SELECT DISTINCT ON (emote_hash) emote_id, emote_hash, usable, animated, emote_sha, guild_id, trim(name), has_roles FROM emote_ids WHERE emote_hash=ANY(%(emote_hashes)s) and guild_id is not null and usable=true",
+                parameters={"emote_hashes": emote_hashes},
+            )
+        else:
+            await self.cur.execute(
+                "SELECT DISTINCT ON (emote_hash) emote_id, emote_hash, usable, animated, emote_sha, guild_id, trim(name), has_roles FROM emote_ids WHERE emote_hash=ANY(%(emote_hashes)s) and usable=true",
+                parameters={"emote_hashes": emote_hashes},
+            )
+        results = await self.cur.fetchall()
+        return {emote.emote_hash: emote for emote in (SQLEmoji(*i) for i in results)}
+
     async def set_emote_perceptual_data(
         self,
         emote_id: int,
@@ -156,6 +258,9 @@ class EmojisMixin(_PostgresConnection):
                 "has_roles": has_roles,
             },
         )
+        # A conflict keeps the stored emote_hash, which the index already has if it knows the emote
+        if self.perceptual_index is not None and emote_id not in self.perceptual_index:
+            self.perceptual_index.add(emote_id, emote_hash)
 
     async def set_emote_guild(
         self,
@@ -188,6 +293,51 @@ class EmojisMixin(_PostgresConnection):
                 },
             )
 
+    async def set_emotes_perceptual_data(self, emotes: List[SQLEmoji]):
+        # Many set_emote_perceptual_data calls in one statement, the last entry for an emote_id wins
+        emotes = list({emote.emote_id: emote for emote in emotes}.values())
+        if not emotes:
+            return
+        await self.cur.execute(
+            "INSERT INTO emote_ids (emote_id, emote_hash, usable, animated, emote_sha, guild_id, name, has_roles) "
+            "SELECT * FROM unnest(%(emote_ids)s::bigint[], %(emote_hashes)s::text[], %(usable)s::bool[], %(animated)s::bool[], "
+            "%(emote_shas)s::text[], %(guild_ids)s::bigint[], %(names)s::text[], %(has_roles)s::bool[]) "
+            "ON CONFLICT (emote_id) DO UPDATE SET name=excluded.name, has_roles=excluded.has_roles, guild_id=coalesce(emote_ids.guild_id, excluded.guild_id)",
+            parameters={
+                "emote_ids": [emote.emote_id for emote in emotes],
+                "emote_hashes": [emote.emote_hash for emote in emotes],
+                "usable": [emote.usable for emote in emotes],
+                "animated": [emote.animated for emote in emotes],
+                "emote_shas": [emote.emote_sha for emote in emotes],
+                "guild_ids": [emote.guild_id for emote in emotes],
+                "names": [emote.name for emote in emotes],
+                "has_roles": [emote.has_roles for emote in emotes],
+            },
+        )
+        if self.perceptual_index is not None:
+            for emote in emotes:
+                if emote.emote_id not in self.perceptual_index:
+                    self.perceptual_index.add(emote.emote_id, emote.emote_hash)
+
+    async def set_emotes_guild(self, updates: List[EmoteGuildUpdate]):
+        # Many set_emote_guild calls in one statement, a usable of None leaves it unchanged.
+        # The last entry for an emote_id wins.
+        updates = list({update.emote_id: update for update in updates}.values())
+        if not updates:
+            return
+        await self.cur.execute(
+            "UPDATE emote_ids SET guild_id=t.guild_id, usable=coalesce(t.usable, emote_ids.usable), name=t.name, has_roles=t.has_roles "
+            "FROM unnest(%(emote_ids)s::bigint[], %(guild_ids)s::bigint[], %(usable)s::bool[], %(has_roles)s::bool[], %(names)s::text[]) "
+            "as t(emote_id, guild_id, usable, has_roles, name) where emote_ids.emote_id=t.emote_id",
+            parameters={
+                "emote_ids": [update.emote_id for update in updates],
+                "guild_ids": [update.guild_id for update in updates],
+                "usable": [update.usable for update in updates],
+                "has_roles": [update.has_roles for update in updates],
+                "names": [update.name for update in updates],
+            },
+        )
+
     async def increment_guild_emote_score(self, emoji_guild_ids: List[Tuple[int, int]]):
         # Make sure the formula for the bitshifting gives -1, as 2 >> -1 = 0, which is what we want if we want to give
         # the first numbers 100% chance
@@ -201,13 +351,69 @@ class EmojisMixin(_PostgresConnection):
             parameters={"emoji_guild_ids": emoji_guild_ids},
         )
 
-    async def decay_guild_emote_score(self):
+    async def apply_guild_emote_score_uses(self, uses: Dict[Tuple[int, int], int]):
+        # Same outcome as calling increment_guild_emote_score once per use, with the dice rolled here.
+        # uses maps (guild_id, emote_id) to how many times it was used.
+        if not uses:
+            return
         await self.cur.execute(
-            'update emote_ids set score=(score::int - 1)::"char" '
-            "where guild_id in (select guild_id from emote_ids where score::int > -28 and guild_id is not null) and "
-            "score::int != -128",  # -128 is smallest number
-            parameters={},
+            "SELECT guild_id, emote_id, score::int FROM emote_ids "
+            "where (guild_id, emote_id) in (SELECT * FROM unnest(%(guild_ids)s::bigint[], %(emote_ids)s::bigint[]))",
+            parameters={
+                "guild_ids": [guild_id for guild_id, _ in uses],
+                "emote_ids": [emote_id for _, emote_id in uses],
+            },
         )
+        deltas = []
+        for guild_id, emote_id, score in await self.cur.fetchall():
+            new_score = apply_uses(score, uses.get((guild_id, emote_id), 0))
+            if new_score != score:
+                deltas.append((guild_id, emote_id, new_score - score))
+        if not deltas:
+            return
+        # Apply as a change rather than the new value, in case it moved since we read it
+        await self.cur.execute(
+            'UPDATE emote_ids SET score=least(score::int + t.delta, 127)::"char" '
+            "FROM unnest(%(guild_ids)s::bigint[], %(emote_ids)s::bigint[], %(deltas)s::int[]) as t(guild_id, emote_id, delta) "
+            "where emote_ids.guild_id=t.guild_id and emote_ids.emote_id=t.emote_id",
+            parameters={
+                "guild_ids": [guild_id for guild_id, _, _ in deltas],
+                "emote_ids": [emote_id for _, emote_id, _ in deltas],
+                "deltas": [delta for _, _, delta in deltas],
+            },
+        )
+
+    async def decay_guild_emote_score(self, *, chunk_size: int = 1000) -> int:
+        # Each chunk commits on its own so foreground queries never wait on the whole table.
+        # Use ScoreDecay to pause, resume or spread the chunks over pool connections.
+        last_emote_id, rows_touched = 0, 0
+        while last_emote_id is not None:
+            last_emote_id, touched = await self.decay_guild_emote_score_chunk(
+                last_emote_id, chunk_size
+            )
+            rows_touched += touched
+        return rows_touched
+
+    async def decay_guild_emote_score_chunk(
+        self, after_emote_id: int, limit: int
+    ) -> Tuple[Optional[int], int]:
+        # Returns the last emote_id walked, None once past the end, and how many scores changed.
+        # A guild decays if any of its emotes scores over -28. That's checked per chunk for only the chunk's guilds,
+        # allowing for the emotes before it having already been decayed once this run.
+        await self.cur.execute(
+            "WITH chunk AS (SELECT emote_id, guild_id FROM emote_ids where emote_id > %(after_emote_id)s "
+            "ORDER BY emote_id LIMIT %(limit)s), "
+            "decaying AS (SELECT DISTINCT guild_id FROM chunk where guild_id is not null and exists "
+            "(select 1 from emote_ids where emote_ids.guild_id=chunk.guild_id and "
+            "score::int > case when emote_ids.emote_id <= %(after_emote_id)s then -29 else -28 end)), "
+            'decayed AS (update emote_ids set score=(score::int - 1)::"char" FROM chunk '
+            "where emote_ids.emote_id=chunk.emote_id and emote_ids.guild_id in (select guild_id from decaying) and "
+            "score::int != -128 RETURNING 1) "  # -128 is smallest number
+            "SELECT (SELECT max(emote_id) FROM chunk), (SELECT count(*) FROM decayed)",
+            parameters={"after_emote_id": after_emote_id, "limit": limit},
+        )
+        ((last_emote_id, touched),) = await self.cur.fetchall()
+        return last_emote_id, touched
 
     async def guild_emote_scores(self, guild_id: int) -> Counter:
         await self.cur.execute(
@@ -228,6 +434,14 @@ class EmojisMixin(_PostgresConnection):
         return emote_score[0][0]
 
     async def daily_scores_for_emotes(self, emote_id: int) -> int:
+        emote_hash = self._cached_emote_hash(emote_id)
+        if emote_hash is not None:
+            await self.cur.execute(
+                "select score::int + 128 as score from emote_ids where emote_hash=%(emote_hash)s and score::int > -28",
+                parameters={"emote_hash": emote_hash},
+            )
+            emote_scores = await self.cur.fetchall()
+            return [score for score, in emote_scores]
         await self.cur.execute(
             "select score::int + 128 as score from emote_ids where emote_hash=(select emote_hash from emote_ids where emote_id=%(emote_id)s) and score::int > -28",
             parameters={"emote_id": emote_id},
@@ -290,6 +504,17 @@ class EmojisMixin(_PostgresConnection):
             "guild_id=%(guild_id)s", emote_name, parameters={"guild_id": guild_id}
         )
 
+    async def get_emotes_by_name(
+        self, scope: EmoteScope, scope_id: Union[int, str], emote_names: List[str]
+    ) -> Dict[str, Emoji]:
+        # Bulk counterpart of get_guild_emote, get_mutual_guild_emote, get_pack_guild_emote and get_pack_emote.
+        # scope_id is the guild_id, user_id, user_id or pack name respectively.
+        emotes = await self._ranked_get_emotes(
+            _SCOPE_WHERE[scope], emote_names, parameters={"scope": scope_id}
+        )
+        emotes = {name: self._get_emoji(emote) for name, emote in emotes.items()}
+        return {name: emote for name, emote in emotes.items() if emote}
+
     async def guild_emote_counts(self, guild_id: int) -> EmojiCounts:
         await self.cur.execute(
             "SELECT COUNT(*) filter(where not animated) as static, COUNT(*) filter(where animated) as animated FROM emote_ids where guild_id=%(guild_id)s",
@@ -351,21 +576,23 @@ class EmojisMixin(_PostgresConnection):
         results = await self.cur.fetchall()
         return results
 
-    async def get_guild_emotes_raw(self, guild_id: int) -> List:
-        await self.cur.execute(
+    async def get_guild_emotes_raw(
+        self, guild_id: int, *, columnar: bool = False
+    ) -> Union[List[SQLEmoji], EmojiColumns]:
+        return await self._get_raw_emotes(
             f"select emote_id, emote_hash, usable, animated, emote_sha, guild_id, trim(name), has_roles from emote_ids where guild_id = %(guild_id)s",
             parameters={"guild_id": guild_id},
+            columnar=columnar,
         )
-        results = await self.cur.fetchall()
-        return [SQLEmoji(*i) for i in results]
 
-    async def get_emotes_raw(self, emote_ids: List[int]) -> List:
-        await self.cur.execute(
+    async def get_emotes_raw(
+        self, emote_ids: List[int], *, columnar: bool = False
+    ) -> Union[List[SQLEmoji], EmojiColumns]:
+        return await self._get_raw_emotes(
             f"select emote_id, emote_hash, usable, animated, emote_sha, guild_id, trim(name), has_roles from emote_ids where emote_id = ANY(%(emote_ids)s)",
             parameters={"emote_ids": emote_ids},
+            columnar=columnar,
         )
-        results = await self.cur.fetchall()
-        return [SQLEmoji(*i) for i in results]
 
     async def get_emotes(self, emote_ids: List[int]) -> List[Emoji]:
         return await self._get_emojis(
@@ -388,19 +615,48 @@ class EmojisMixin(_PostgresConnection):
         return [self._get_emoji(SQLEmoji(*emote)) for emote in results]
 
     async def get_raw_indexable_emotes_for_hash(
-        self, emote_hash: str
-    ) -> List[SQLEmoji]:
-        await self.cur.execute(
+        self, emote_hash: str, *, columnar: bool = False
+    ) -> Union[List[SQLEmoji], EmojiColumns]:
+        return await self._get_raw_emotes(
             "select emote_id, emote_hash, usable, animated, emote_sha, guild_id, trim(name), has_roles from emote_ids where emote_hash=%(emote_hash)s and guild_id is not null and COALESCE((select enable_emoji_search from guild_settings where guild_id=emote_ids.guild_id), true)",
             parameters={"emote_hash": emote_hash},
+            columnar=columnar,
         )
-        results = await self.cur.fetchall()
-        return [SQLEmoji(*emote) for emote in results]
 
-    async def get_all_emotes_min(self, min_id: int, limit: int) -> List[SQLEmoji]:
-        await self.cur.execute(
+    async def get_all_emotes_min(
+        self, min_id: int, limit: int, *, columnar: bool = False
+    ) -> Union[List[SQLEmoji], EmojiColumns]:
+        return await self._get_raw_emotes(
             "select emote_id, emote_hash, usable, animated, emote_sha, guild_id, trim(name), has_roles from emote_ids where emote_id>%(min_id)s order by emote_id LIMIT %(limit)s",
             parameters={"min_id": min_id, "limit": limit},
+            columnar=columnar,
+        )
+
+    async def _get_raw_emotes(
+        self, query: str, *, parameters, columnar: bool
+    ) -> Union[List[SQLEmoji], EmojiColumns]:
+        if not columnar:
+            await self.cur.execute(query, parameters=parameters)
+            results = await self.cur.fetchall()
+            return [SQLEmoji(*emote) for emote in results]
+        # Rows go straight into the columns, streamed when stream_batch_size is set
+        columns = EmojiColumns()
+        async for row in self._stream(query, parameters):
+            columns.append(row)
+        return columns
+
+    async def emote_id_bounds(self) -> Tuple[Optional[int], Optional[int]]:
+        await self.cur.execute(
+            "select min(emote_id), max(emote_id) from emote_ids", parameters={}
+        )
+        return tuple((await self.cur.fetchall())[0])
+
+    async def get_emotes_in_range(
+        self, min_id: int, max_id: int, limit: int
+    ) -> List[SQLEmoji]:
+        await self.cur.execute(
+            "select emote_id, emote_hash, usable, animated, emote_sha, guild_id, trim(name), has_roles from emote_ids where emote_id>%(min_id)s and emote_id<=%(max_id)s order by emote_id LIMIT %(limit)s",
+            parameters={"min_id": min_id, "max_id": max_id, "limit": limit},
         )
         results = await self.cur.fetchall()
         return [SQLEmoji(*emote) for emote in results]
@@ -417,10 +673,23 @@ class EmojisMixin(_PostgresConnection):
             ids.append(emote["id"])
             hashes.append(emote["perceptual"])
             shas.append(emote["sha"])
+        # Notifies EMOTE_HASH_CHANNEL so every process's EmoteHashCache drops them
         await self.cur.execute(
-            "update emote_ids set emote_sha=t.sha, emote_hash=t.perceptual from (SELECT * from unnest(%(ids)s, %(shas)s, %(hashes)s) as t(id, sha, perceptual)) t where emote_ids.emote_id = t.id",
-            parameters={"ids": ids, "shas": shas, "hashes": hashes},
+            "WITH updated AS (update emote_ids set emote_sha=t.sha, emote_hash=t.perceptual from (SELECT * from unnest(%(ids)s, %(shas)s, %(hashes)s) as t(id, sha, perceptual)) t where emote_ids.emote_id = t.id RETURNING emote_ids.emote_id) "
+            "SELECT pg_notify(%(channel)s, emote_id::text) FROM updated",
+            parameters={
+                "ids": ids,
+                "shas": shas,
+                "hashes": hashes,
+                "channel": EMOTE_HASH_CHANNEL,
+            },
         )
+        if self.emote_hash_cache is not None:
+            for emote_id in ids:
+                self.emote_hash_cache.pop(emote_id)
+        if self.perceptual_index is not None:
+            for emote_id, emote_hash in zip(ids, hashes):
+                self.perceptual_index.add(emote_id, emote_hash)
 
     async def _get_emojis(
         self, query_where, query_suffix: str = "", *, parameters
@@ -436,6 +705,10 @@ class EmojisMixin(_PostgresConnection):
     async def _case_insensitive_get_emote(
         self, query_where, emote_name: str, parameters
     ) -> Optional[Emoji]:
+        if self.ranked_emote_lookup:
+            return self._sql_emoji_to_emoji(
+                await self._ranked_get_emote(query_where, emote_name, parameters)
+            )
         case_insensitive = await self._get_emote_with_where(
             f"{query_where} and lower(trim(name))=lower(%(emote_name)s)",
             emote_name,
@@ -478,6 +751,41 @@ class EmojisMixin(_PostgresConnection):
         if usable_case_insensitive is not None:
             return self._get_emoji(usable_case_insensitive)
 
+    async def _ranked_get_emote(
+        self, query_where: str, emote_name: str, parameters
+    ) -> Optional[SQLEmoji]:
+        emotes = await self._ranked_get_emotes(query_where, [emote_name], parameters)
+        return emotes.get(emote_name)
+
+    async def _ranked_get_emotes(
+        self, query_where: str, emote_names: List[str], parameters
+    ) -> Dict[str, SQLEmoji]:
+        # The same cascade as _case_insensitive_get_emote, in one round trip. In order of preference:
+        # 0: usable case-sensitive match
+        # 1: usable copy (by hash) of an unusable case-sensitive match
+        # 2: usable case-insensitive match
+        # 3: usable copy (by hash) of an unusable case-insensitive match
+        if not emote_names:
+            return {}
+        await self.cur.execute(
+            "with names as (select distinct unnest(%(emote_names)s::text[]) as wanted), "
+            "matches as ("
+            "select names.wanted, emote_id, emote_hash, usable, animated, emote_sha, guild_id, trim(name) as name, has_roles "
+            "from emote_ids join names on lower(trim(name))=lower(names.wanted) "
+            f"where {query_where} and has_roles=false and manual_block=false"
+            ") "
+            "select distinct on (wanted) wanted, emote_id, emote_hash, usable, animated, emote_sha, guild_id, name, has_roles from ("
+            "select matches.*, case when matches.name=matches.wanted then 0 else 2 end as rank from matches where matches.usable=true "
+            "union all "
+            "select matches.wanted, copies.emote_id, copies.emote_hash, copies.usable, copies.animated, copies.emote_sha, copies.guild_id, trim(copies.name), copies.has_roles, "
+            "case when matches.name=matches.wanted then 1 else 3 end from matches join emote_ids copies on copies.emote_hash=matches.emote_hash "
+            "where matches.usable is not true and copies.guild_id is not null and copies.usable=true"
+            ") ranked order by wanted, rank",
+            parameters={**parameters, "emote_names": emote_names},
+        )
+        results = await self.cur.fetchall()
+        return {wanted: SQLEmoji(*emote) for wanted, *emote in results}
+
     async def _get_emote_with_where(
         self, query_where: str, emote_name: str, parameters
     ) -> Optional[SQLEmoji]:
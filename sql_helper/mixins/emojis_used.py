@@ -1,5 +1,6 @@
 from datetime import datetime
-from typing import List, Tuple, Optional
+from itertools import islice
+from typing import Iterable, List, Tuple, Optional
 from discord import PartialEmoji
 from .._connection import _PostgresConnection
 
@@ -26,6 +27,29 @@ class EmojisUsedMixin(_PostgresConnection):
             parameters=params,
         )
 
+    async def ingest_used_emotes(
+        self,
+        to_cache: Iterable[Tuple[int, PartialEmoji, datetime]],
+        *,
+        chunk_size: int = 10000,
+    ):
+        # Like add_used_emotes, but for very large or streamed batches, never holding more than chunk_size at once.
+        # times isn't cast, so like add_used_emotes naive and aware datetimes each keep their own type
+        # and the column converts them as it always has.
+        to_cache = iter(to_cache)
+        while chunk := list(islice(to_cache, chunk_size)):
+            await self.cur.execute(
+                "INSERT INTO emotes_used (time, guild_id, name, emote_id, animated) "
+                "SELECT * FROM unnest(%(times)s, %(guild_ids)s::bigint[], %(names)s::text[], %(ids)s::bigint[], %(animateds)s::boolean[])",
+                parameters={
+                    "times": [time for _, _, time in chunk],
+                    "guild_ids": [guild_id for guild_id, _, _ in chunk],
+                    "names": [emote.name for _, emote, _ in chunk],
+                    "ids": [emote.id for _, emote, _ in chunk],
+                    "animateds": [emote.animated for _, emote, _ in chunk],
+                },
+            )
+
     async def get_recently_used_emote(
         self, guild_id: int, name: str
     ) -> Optional[PartialEmoji]:
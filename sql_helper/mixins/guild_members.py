@@ -1,21 +1,56 @@
-from typing import Union, Optional, List
+import random
+from itertools import islice
+from typing import Dict, Iterable, Union, Optional, List, Set
 from discord import User
 
 from ..async_list import AsyncList, async_list
+from ..member_sync_result import MemberSyncResult
 from .._connection import _PostgresConnection
 
 
 class GuildMembersMixin(_PostgresConnection):
     @async_list
     async def mutual_guild_ids(self, user_id: Union[User, int]) -> AsyncList:
+        # Sorted, so the order is the same whether or not it came from mutual_guilds_cache
         if not isinstance(user_id, int):
             user_id = user_id.id
+        if self.mutual_guilds_cache is not None:
+            return sorted((await self.mutual_guild_ids_many([user_id]))[user_id])
         await self.cur.execute(
             "SELECT guild_id FROM members WHERE user_id=%(user_id)s",
             parameters={"user_id": user_id},
         )
         guilds = await self.cur.fetchall()
-        return [g for g, in guilds]
+        return sorted(g for g, in guilds)
+
+    async def mutual_guild_ids_many(
+        self, user_ids: Iterable[Union[User, int]]
+    ) -> Dict[int, Set[int]]:
+        # Every user's guild_ids from one query, users sharing no guilds get an empty set.
+        # Fills and reads mutual_guilds_cache when there is one.
+        user_ids = {i if isinstance(i, int) else i.id for i in user_ids}
+        cache = self.mutual_guilds_cache
+        rtn = {}
+        if cache is not None:
+            for user_id in list(user_ids):
+                guild_ids = cache.get(user_id)
+                if guild_ids is not None:
+                    rtn[user_id] = set(guild_ids)
+                    user_ids.discard(user_id)
+            generation = cache.generation()
+        if not user_ids:
+            return rtn
+        await self.cur.execute(
+            "SELECT user_id, array_agg(guild_id) FROM members WHERE user_id=ANY(%(user_ids)s::bigint[]) GROUP BY user_id",
+            parameters={"user_ids": list(user_ids)},
+        )
+        found = dict(await self.cur.fetchall())
+        for user_id in user_ids:
+            guild_ids = frozenset(found.get(user_id, ()))
+            rtn[user_id] = set(guild_ids)
+            if cache is not None:
+                cache.set(user_id, guild_ids, generation)
+        return rtn
 
     @async_list
     async def mutual_guilds(self, user_id: Union[User, int]) -> AsyncList:
@@ -34,24 +69,86 @@ class GuildMembersMixin(_PostgresConnection):
         return bool(await self.cur.fetchall())
 
     async def random_member(self, guild_id: int) -> Optional[int]:
-        for i in range(10):
+        members = await self.random_members(guild_id, 1)
+        return members[0] if members else None
+
+    async def random_members(self, guild_id: int, k: int) -> List[int]:
+        # Up to k distinct members picked uniformly, fewer only if the guild is smaller than k
+        cache = self.guild_member_cache
+        if cache is None:
+            await self.cur.execute(
+                "SELECT user_id FROM members WHERE guild_id=%(guild_id)s ORDER BY random() LIMIT %(k)s",
+                parameters={"guild_id": guild_id, "k": k},
+            )
+            return [user_id for user_id, in await self.cur.fetchall()]
+        members = cache.get(guild_id)
+        if members is None:
+            generation = cache.generation()
             await self.cur.execute(
-                "SELECT user_id FROM members WHERE guild_id=%(guild_id)s AND random() < (SELECT 2::decimal/count(*) FROM members WHERE guild_id=%(guild_id)s) LIMIT 1",
+                "SELECT user_id FROM members WHERE guild_id=%(guild_id)s",
                 parameters={"guild_id": guild_id},
             )
-            user_id = await self.cur.fetchall()
-            if user_id:
-                return user_id[0][0]
-        return
+            members = cache.set(
+                guild_id,
+                (user_id for user_id, in await self.cur.fetchall()),
+                generation,
+            )
+        return random.sample(members, min(k, len(members)))
+
+    async def set_user_guilds(
+        self, user_id: int, guild_ids: List[int]
+    ) -> MemberSyncResult:
+        # Only the rows that differ from what's stored are inserted or deleted, in one statement
+        await self.cur.execute(
+            "WITH removed AS (DELETE FROM members WHERE user_id=%(user_id)s AND guild_id <> ALL(%(guild_ids)s::bigint[]) RETURNING guild_id), "
+            "added AS (INSERT INTO members (guild_id, user_id) SELECT DISTINCT guild_id, %(user_id)s FROM unnest(%(guild_ids)s::bigint[]) as t(guild_id) "
+            "WHERE NOT EXISTS (SELECT 1 FROM members WHERE members.user_id=%(user_id)s AND members.guild_id=t.guild_id) ON CONFLICT DO NOTHING RETURNING guild_id) "
+            "SELECT ARRAY(SELECT guild_id FROM added), ARRAY(SELECT guild_id FROM removed)",
+            parameters={"user_id": user_id, "guild_ids": guild_ids},
+        )
+        ((added, removed),) = await self.cur.fetchall()
+        if self.guild_member_cache is not None:
+            for guild_id in added + removed:
+                self.guild_member_cache.invalidate(guild_id)
+        if self.mutual_guilds_cache is not None:
+            self.mutual_guilds_cache.pop(user_id)
+        return MemberSyncResult(len(added), len(removed))
 
-    async def set_user_guilds(self, user_id: int, guild_ids: List[int]):
+    async def sync_guild_members(
+        self,
+        guild_id: int,
+        user_ids: Iterable[int],
+        *,
+        replace: bool = True,
+        chunk_size: int = 10000,
+    ) -> MemberSyncResult:
+        # For a guild's whole member list. aiopg can't COPY, so user_ids are staged in a temporary table
+        # one chunk of arrays at a time, then diffed against members in one statement.
+        # replace removes members missing from user_ids, otherwise they're only added.
         async with self.cur.begin():
             await self.cur.execute(
-                "DELETE FROM members WHERE members.user_id = %(user_id)s",
-                parameters={"user_id": user_id},
+                "CREATE TEMPORARY TABLE member_sync (user_id bigint PRIMARY KEY) ON COMMIT DROP",
+                parameters={},
             )
-            for guild_id in guild_ids:
+            user_ids = iter(user_ids)
+            while chunk := list(islice(user_ids, chunk_size)):
                 await self.cur.execute(
-                    "INSERT INTO members (guild_id, user_id) VALUES (%(guild_id)s, %(user_id)s)",
-                    parameters={"user_id": user_id, "guild_id": guild_id},
+                    "INSERT INTO member_sync SELECT unnest(%(user_ids)s::bigint[]) ON CONFLICT DO NOTHING",
+                    parameters={"user_ids": chunk},
                 )
+            await self.cur.execute(
+                "WITH removed AS (DELETE FROM members WHERE guild_id=%(guild_id)s AND %(replace)s "
+                "AND NOT EXISTS (SELECT 1 FROM member_sync WHERE member_sync.user_id=members.user_id) RETURNING user_id), "
+                "added AS (INSERT INTO members (guild_id, user_id) SELECT %(guild_id)s, user_id FROM member_sync "
+                "WHERE NOT EXISTS (SELECT 1 FROM members WHERE members.guild_id=%(guild_id)s AND members.user_id=member_sync.user_id) "
+                "ON CONFLICT DO NOTHING RETURNING user_id) "
+                "SELECT ARRAY(SELECT user_id FROM added), ARRAY(SELECT user_id FROM removed)",
+                parameters={"guild_id": guild_id, "replace": replace},
+            )
+            ((added, removed),) = await self.cur.fetchall()
+        if self.guild_member_cache is not None and (added or removed):
+            self.guild_member_cache.invalidate(guild_id)
+        if self.mutual_guilds_cache is not None:
+            for user_id in added + removed:
+                self.mutual_guilds_cache.pop(user_id)
+        return MemberSyncResult(len(added), len(removed))
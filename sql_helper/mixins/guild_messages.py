@@ -1,5 +1,8 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as Base64Error
+from itertools import islice
 from typing import Optional, List, Iterable, Dict, Tuple
-from ..guild_message import GuildMessage
+from ..guild_message import GuildMessage, GuildMessagePage
 
 from ..async_list import async_list
 from .._connection import _PostgresConnection
@@ -39,6 +42,28 @@ class GuildMessagesMixin(_PostgresConnection):
             },
         )
 
+    async def ingest_guild_messages(
+        self, messages: Iterable[GuildMessage], *, chunk_size: int = 10000
+    ) -> int:
+        # For very large or streamed batches. aiopg can't COPY, so messages are sent as arrays one chunk at a time,
+        # never holding more than chunk_size of them. Returns how many were new.
+        inserted = 0
+        messages = iter(messages)
+        while chunk := list(islice(messages, chunk_size)):
+            await self.cur.execute(
+                "INSERT INTO guild_messages (guild_id, channel_id, message_id, user_id) "
+                "SELECT * FROM unnest(%(guild_ids)s::bigint[], %(channel_ids)s::bigint[], %(message_ids)s::bigint[], %(user_ids)s::bigint[]) "
+                "ON CONFLICT ON CONSTRAINT guild_messages_pk DO NOTHING",
+                parameters={
+                    "guild_ids": [i.guild_id for i in chunk],
+                    "channel_ids": [i.channel_id for i in chunk],
+                    "message_ids": [i.message_id for i in chunk],
+                    "user_ids": [i.user_id for i in chunk],
+                },
+            )
+            inserted += self.cur.rowcount
+        return inserted
+
     async def delete_guild_message(self, *, message_id: int):
         await self.cur.execute(
             "DELETE FROM guild_messages where message_id=%(message_id)s",
@@ -57,7 +82,7 @@ class GuildMessagesMixin(_PostgresConnection):
         offset: Optional[int] = None,
         no_results: Optional[int],
     ) -> List[GuildMessage]:
-        await self._get_guild_message(
+        query, params = _guild_message_query(
             "guild_id, channel_id, message_id, user_id",
             "ORDER BY message_id DESC",
             message_id,
@@ -68,8 +93,61 @@ class GuildMessagesMixin(_PostgresConnection):
             offset,
             no_results,
         )
+        async for row in self._stream(query, params):
+            yield GuildMessage(*row)
+
+    async def get_guild_messages_page(
+        self,
+        *,
+        message_id: Optional[int] = None,
+        guild_id: Optional[int] = None,
+        channel_id: Optional[int] = None,
+        user_id: Optional[int] = None,
+        cursor: Optional[str] = None,
+        limit: int = 50,
+    ) -> GuildMessagePage:
+        # Pages by message_id rather than OFFSET, so deep pages cost the same as the first
+        before_id = after_id = None
+        if cursor is not None:
+            direction, cursor_id = _decode_cursor(cursor)
+            if direction == "before":
+                before_id = cursor_id
+            else:
+                after_id = cursor_id
+        await self._get_guild_message(
+            "guild_id, channel_id, message_id, user_id",
+            (
+                "ORDER BY message_id ASC"
+                if after_id is not None
+                else "ORDER BY message_id DESC"
+            ),
+            message_id,
+            guild_id,
+            channel_id,
+            user_id,
+            after_id,
+            None,
+            limit + 1,
+            before_id,
+        )
         results = await self.cur.fetchall()
-        return [GuildMessage(*i) for i in results]
+        has_more = len(results) > limit
+        messages = [GuildMessage(*i) for i in results[:limit]]
+        if after_id is not None:
+            messages.reverse()
+        if not messages:
+            return GuildMessagePage(messages)
+        has_older = has_more if after_id is None else True
+        has_newer = has_more if after_id is not None else before_id is not None
+        return GuildMessagePage(
+            messages,
+            before=(
+                _encode_cursor("before", messages[-1].message_id) if has_older else None
+            ),
+            after=(
+                _encode_cursor("after", messages[0].message_id) if has_newer else None
+            ),
+        )
 
     @async_list
     async def get_guild_message_ids(
@@ -112,61 +190,67 @@ class GuildMessagesMixin(_PostgresConnection):
         results = await self.cur.fetchall()
         return bool(results)
 
-    async def _get_guild_message(
-        self,
-        select: str,
-        order: str,
-        message_id: Optional[int] = None,
-        guild_id: Optional[int] = None,
-        channel_id: Optional[int] = None,
-        user_id: Optional[int] = None,
-        after_id: Optional[int] = None,
-        offset: Optional[int] = None,
-        no_results: Optional[int] = 1,
-    ):
-        params = {
-            "message_id": message_id,
-            "guild_id": guild_id,
-            "channel_id": channel_id,
-            "user_id": user_id,
-            "after_id": after_id,
-            "offset": offset,
-            "limit": no_results,
-        }
-        if message_id is not None:
-            await self.cur.execute(
-                f"SELECT {select} FROM guild_messages WHERE message_id=%(message_id)s {_get_after_clause(after_id)} {_get_limit_clause(no_results, offset)}",
-                parameters=params,
-            )
-        elif channel_id is not None and user_id is not None:
-            await self.cur.execute(
-                f"SELECT {select} FROM guild_messages WHERE channel_id=%(channel_id)s AND user_id=%(user_id)s {_get_after_clause(after_id)} {order} {_get_limit_clause(no_results, offset)}",
-                parameters=params,
-            )
-        elif channel_id is not None:
-            await self.cur.execute(
-                f"SELECT {select} FROM guild_messages WHERE channel_id=%(channel_id)s {_get_after_clause(after_id)} {order} {_get_limit_clause(no_results, offset)}",
-                parameters=params,
-            )
-        elif guild_id is not None and user_id is not None:
-            await self.cur.execute(
-                f"SELECT {select} FROM guild_messages WHERE guild_id=%(guild_id)s AND user_id=%(user_id)s {_get_after_clause(after_id)} {order} {_get_limit_clause(no_results, offset)}",
-                parameters=params,
-            )
-        elif guild_id is not None:
-            await self.cur.execute(
-                f"SELECT {select} FROM guild_messages WHERE guild_id=%(guild_id)s {_get_after_clause(after_id)} {order} {_get_limit_clause(no_results, offset)}",
-                parameters=params,
-            )
-        elif user_id is not None:
-            await self.cur.execute(
-                f"SELECT {select} FROM guild_messages WHERE user_id=%(user_id)s {_get_after_clause(after_id)} {order} {_get_limit_clause(no_results, offset)}",
-                parameters=params,
-            )
-        else:
-            raise NotImplementedError(
-                f"Invalid combination of requests: message_id={message_id} guild_id={guild_id} channel_id={channel_id} user_id={user_id}"
-            )
+    async def _get_guild_message(self, *args, **kwargs):
+        query, params = _guild_message_query(*args, **kwargs)
+        await self.cur.execute(query, parameters=params)
+
+
+def _guild_message_query(
+    select: str,
+    order: str,
+    message_id: Optional[int] = None,
+    guild_id: Optional[int] = None,
+    channel_id: Optional[int] = None,
+    user_id: Optional[int] = None,
+    after_id: Optional[int] = None,
+    offset: Optional[int] = None,
+    no_results: Optional[int] = 1,
+    before_id: Optional[int] = None,
+) -> Tuple[str, dict]:
+    params = {
+        "message_id": message_id,
+        "guild_id": guild_id,
+        "channel_id": channel_id,
+        "user_id": user_id,
+        "after_id": after_id,
+        "before_id": before_id,
+        "offset": offset,
+        "limit": no_results,
+    }
+    if message_id is not None:
+        return (
+            f"SELECT {select} FROM guild_messages WHERE message_id=%(message_id)s {_get_after_clause(after_id)} {_get_before_clause(before_id)} {_get_limit_clause(no_results, offset)}",
+            params,
+        )
+    elif channel_id is not None and user_id is not None:
+        return (
+            f"SELECT {select} FROM guild_messages WHERE channel_id=%(channel_id)s AND user_id=%(user_id)s {_get_after_clause(after_id)} {_get_before_clause(before_id)} {order} {_get_limit_clause(no_results, offset)}",
+            params,
+        )
+    elif channel_id is not None:
+        return (
+            f"SELECT {select} FROM guild_messages WHERE channel_id=%(channel_id)s {_get_after_clause(after_id)} {_get_before_clause(before_id)} {order} {_get_limit_clause(no_results, offset)}",
+            params,
+        )
+    elif guild_id is not None and user_id is not None:
+        return (
+            f"SELECT {select} FROM guild_messages WHERE guild_id=%(guild_id)s AND user_id=%(user_id)s {_get_after_clause(after_id)} {_get_before_clause(before_id)} {order} {_get_limit_clause(no_results, offset)}",
+            params,
+        )
+    elif guild_id is not None:
+        return (
+            f"SELECT {select} FROM guild_messages WHERE guild_id=%(guild_id)s {_get_after_clause(after_id)} {_get_before_clause(before_id)} {order} {_get_limit_clause(no_results, offset)}",
+            params,
+        )
+    elif user_id is not None:
+        return (
+            f"SELECT {select} FROM guild_messages WHERE user_id=%(user_id)s {_get_after_clause(after_id)} {_get_before_clause(before_id)} {order} {_get_limit_clause(no_results, offset)}",
+            params,
+        )
+    else:
+        raise NotImplementedError(
+            f"Invalid combination of requests: message_id={message_id} guild_id={guild_id} channel_id={channel_id} user_id={user_id}"
+        )
 
 
 def _get_limit_clause(limit: Optional[int], offset: Optional[int]) -> str:
@@ -182,3 +266,24 @@ def _get_after_clause(after: Optional[int]) -> str:
     if after is None:
         return ""
     return "AND message_id > %(after_id)s"
+
+
+def _get_before_clause(before: Optional[int]) -> str:
+    if before is None:
+        return ""
+    return "AND message_id < %(before_id)s"
+
+
+def _encode_cursor(direction: str, message_id: int) -> str:
+    return urlsafe_b64encode(f"{direction}:{message_id}".encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> Tuple[str, int]:
+    try:
+        direction, message_id = urlsafe_b64decode(cursor.encode()).decode().split(":")
+        message_id = int(message_id)
+    except (Base64Error, UnicodeDecodeError, ValueError):
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+    if direction not in ("before", "after"):
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+    return direction, message_id
@@ -2,6 +2,8 @@ from typing import Union, Optional, List, Tuple, Set
 from discord import Guild
 from dataclasses import fields
 from ..guild_settings import GuildSettings
+from ..guild_settings_cache import NOTIFY_CHANNEL, MISSING
+from ..guild_settings_store import GuildSettingsStore
 
 from ..async_list import AsyncList, async_list
 from .._connection import _PostgresConnection
@@ -23,28 +25,48 @@ class GuildSettingsMixin(_PostgresConnection):
 
     @async_list
     async def guild_prefixes(self) -> AsyncList:
-        await self.cur.execute("SELECT guild_id, prefix FROM guild_settings")
-        return await self.cur.fetchall()
+        async for row in self._stream("SELECT guild_id, prefix FROM guild_settings"):
+            yield row
 
     @async_list
     async def guild_settings(self) -> AsyncList:
-        await self.cur.execute(
+        async for row in self._stream(
             "SELECT guild_id, prefix, locale, max_guildwide_emotes, nitro_role, boost_channel, boost_role, audit_channel, enable_stickers, enable_nitro, enable_replies, is_alias_server, enable_pings, enable_user_content, enable_personas, enable_dashboard_posting, enable_phish_detection, enable_emoji_search, enable_sticker_search FROM guild_settings"
-        )
-        results = await self.cur.fetchall()
-        return [GuildSettings(*i) for i in results]
+        ):
+            yield GuildSettings(*row)
+
+    async def guild_settings_store(
+        self, batch_size: Optional[int] = None
+    ) -> GuildSettingsStore:
+        # batch_size reads that many rows at a time, defaulting to stream_batch_size
+        store = GuildSettingsStore()
+        async for row in self._stream(
+            "SELECT guild_id, prefix, locale, max_guildwide_emotes, nitro_role, boost_channel, boost_role, audit_channel, enable_stickers, enable_nitro, enable_replies, is_alias_server, enable_pings, enable_user_content, enable_personas, enable_dashboard_posting, enable_phish_detection, enable_emoji_search, enable_sticker_search FROM guild_settings",
+            batch_size=batch_size,
+        ):
+            store.add_row(row)
+        return store
 
     async def get_guild_settings(
         self, guild_id: Union[Guild, int]
     ) -> Optional[GuildSettings]:
+        if not isinstance(guild_id, int):
+            guild_id = guild_id.id
+        cache = self.guild_settings_cache
+        if cache is not None:
+            settings = cache.get(guild_id)
+            if settings is not MISSING:
+                return settings
+            generation = cache.generation()
         await self.cur.execute(
             "SELECT guild_id, prefix, locale, max_guildwide_emotes, nitro_role, boost_channel, boost_role, audit_channel, enable_stickers, enable_nitro, enable_replies, is_alias_server, enable_pings, enable_user_content, enable_personas, enable_dashboard_posting, enable_phish_detection, enable_emoji_search, enable_sticker_search FROM guild_settings WHERE guild_id=%(guild_id)s",
             parameters={"guild_id": guild_id},
         )
         results = await self.cur.fetchall()
-        if not results:
-            return None
-        return GuildSettings(*results[0])
+        settings = GuildSettings(*results[0]) if results else None
+        if cache is not None:
+            cache.set(guild_id, settings, generation)
+        return settings
 
     async def get_guild_rank(self, max_emotes: int) -> int:
         await self.cur.execute(
@@ -61,19 +83,32 @@ class GuildSettingsMixin(_PostgresConnection):
         return await self.cur.fetchall()
 
     async def set_guild_settings(self, guild_settings: GuildSettings):
+        # Writes notify NOTIFY_CHANNEL so every process's GuildSettingsCache drops the guild
         await self.cur.execute(
-            "INSERT INTO guild_settings (guild_id, prefix, nitro_role, boost_channel, boost_role, audit_channel, enable_stickers, enable_nitro, enable_replies, is_alias_server, locale, enable_pings, max_guildwide_emotes, enable_user_content, enable_personas, enable_dashboard_posting, enable_phish_detection, enable_emoji_search, enable_sticker_search)  VALUES "
+            "WITH written AS (INSERT INTO guild_settings (guild_id, prefix, nitro_role, boost_channel, boost_role, audit_channel, enable_stickers, enable_nitro, enable_replies, is_alias_server, locale, enable_pings, max_guildwide_emotes, enable_user_content, enable_personas, enable_dashboard_posting, enable_phish_detection, enable_emoji_search, enable_sticker_search)  VALUES "
             "(%(guild_id)s, %(prefix)s, %(nitro_role)s, %(boost_channel)s, %(boost_role)s, %(audit_channel)s, %(enable_stickers)s, %(enable_nitro)s, %(enable_replies)s,  %(is_alias_server)s, %(locale)s, %(enable_pings)s, %(max_guildwide_emotes)s, %(enable_user_content)s, %(enable_personas)s, %(enable_dashboard_posting)s, %(enable_phish_detection)s, %(enable_emoji_search)s, %(enable_sticker_search)s)"
             'ON CONFLICT (guild_id) DO UPDATE SET (prefix, nitro_role, boost_channel, boost_role, audit_channel, enable_stickers, enable_nitro, enable_replies, is_alias_server, "locale", enable_pings, max_guildwide_emotes, enable_user_content, enable_personas, enable_dashboard_posting, enable_phish_detection, enable_emoji_search, enable_sticker_search) = '
-            "(EXCLUDED.prefix, EXCLUDED.nitro_role, EXCLUDED.boost_channel, EXCLUDED.boost_role, EXCLUDED.audit_channel, EXCLUDED.enable_stickers, EXCLUDED.enable_nitro, EXCLUDED.enable_replies, EXCLUDED.is_alias_server, EXCLUDED.locale, EXCLUDED.enable_pings, EXCLUDED.max_guildwide_emotes, EXCLUDED.enable_user_content, EXCLUDED.enable_personas, EXCLUDED.enable_dashboard_posting, EXCLUDED.enable_phish_detection, EXCLUDED.enable_emoji_search, EXCLUDED.enable_sticker_search)",
+            "(EXCLUDED.prefix, EXCLUDED.nitro_role, EXCLUDED.boost_channel, EXCLUDED.boost_role, EXCLUDED.audit_channel, EXCLUDED.enable_stickers, EXCLUDED.enable_nitro, EXCLUDED.enable_replies, EXCLUDED.is_alias_server, EXCLUDED.locale, EXCLUDED.enable_pings, EXCLUDED.max_guildwide_emotes, EXCLUDED.enable_user_content, EXCLUDED.enable_personas, EXCLUDED.enable_dashboard_posting, EXCLUDED.enable_phish_detection, EXCLUDED.enable_emoji_search, EXCLUDED.enable_sticker_search) RETURNING guild_id) "
+            "SELECT pg_notify(%(channel)s, guild_id::text) FROM written",
             parameters={
-                field.name: getattr(guild_settings, field.name)
-                for field in fields(guild_settings)
+                **{
+                    field.name: getattr(guild_settings, field.name)
+                    for field in fields(guild_settings)
+                },
+                "channel": NOTIFY_CHANNEL,
             },
         )
+        self._invalidate_guild_settings(guild_settings.guild_id)
 
     async def delete_guild_settings(self, guild_id: int):
         await self.cur.execute(
-            "DELETE FROM guild_settings WHERE guild_id=%(guild_id)s",
-            parameters={"guild_id": guild_id},
+            "WITH deleted AS (DELETE FROM guild_settings WHERE guild_id=%(guild_id)s RETURNING guild_id) "
+            "SELECT pg_notify(%(channel)s, guild_id::text) FROM deleted",
+            parameters={"guild_id": guild_id, "channel": NOTIFY_CHANNEL},
         )
+        self._invalidate_guild_settings(guild_id)
+
+    def _invalidate_guild_settings(self, guild_id: int):
+        # Our own notification will also arrive, but don't serve stale settings until it does
+        if self.guild_settings_cache is not None:
+            self.guild_settings_cache.invalidate(guild_id)
@@ -28,26 +28,57 @@ class GuildWebhooksMixin(_PostgresConnection):
     async def set_channel_webhooks(
         self, channel_id: int, webhooks: List[DiscordWebhook], *, delete: bool = True
     ):
-        async with self.cur.begin():
-            if delete:
-                await self.cur.execute(
-                    "DELETE FROM webhooks WHERE channel_id=%(channel_id)s",
-                    parameters={"channel_id": channel_id},
-                )
-            for webhook in webhooks:
-                try:
-                    user_id = webhook.user_id
-                except AttributeError:
-                    user_id = webhook.user and webhook.user.id
-                await self.cur.execute(
-                    "INSERT INTO webhooks VALUES (%(webhook_id)s, %(guild_id)s, %(channel_id)s, %(token)s, %(name)s, %(user_id)s) "
-                    "ON CONFLICT (webhook_id) DO UPDATE SET channel_id=excluded.channel_id, name=excluded.name",
-                    parameters={
-                        "webhook_id": webhook.id,
-                        "guild_id": webhook.guild_id,
-                        "channel_id": webhook.channel_id,
-                        "user_id": user_id,
-                        "token": webhook.token,
-                        "name": webhook.name,
-                    },
-                )
+        await self._set_webhooks(
+            "webhooks.channel_id=%(channel_id)s",
+            webhooks,
+            delete=delete,
+            parameters={"channel_id": channel_id},
+        )
+
+    async def set_guild_webhooks(
+        self, guild_id: int, webhooks: List[DiscordWebhook], *, delete: bool = True
+    ):
+        # set_channel_webhooks for every channel in a guild at once
+        await self._set_webhooks(
+            "webhooks.guild_id=%(guild_id)s",
+            webhooks,
+            delete=delete,
+            parameters={"guild_id": guild_id},
+        )
+
+    async def _set_webhooks(
+        self, scope: str, webhooks: List[DiscordWebhook], *, delete: bool, parameters
+    ):
+        # One statement for the whole sync. With delete, webhooks in scope that aren't given are removed
+        # and the ones that are take every new value, as if the scope had been emptied and refilled.
+        # Otherwise, and for webhooks moved in from elsewhere, only channel_id and name are updated.
+        webhooks = list({webhook.id: webhook for webhook in webhooks}.values())
+        if not webhooks and not delete:
+            return
+        await self.cur.execute(
+            "WITH deleted AS (DELETE FROM webhooks WHERE %(delete)s AND "
+            f"{scope} AND webhook_id <> ALL(%(webhook_ids)s::bigint[])) "
+            "INSERT INTO webhooks SELECT * FROM unnest(%(webhook_ids)s::bigint[], %(guild_ids)s::bigint[], %(channel_ids)s::bigint[], "
+            "%(tokens)s::text[], %(names)s::text[], %(user_ids)s::bigint[]) "
+            "ON CONFLICT (webhook_id) DO UPDATE SET channel_id=excluded.channel_id, name=excluded.name, "
+            f"guild_id=CASE WHEN %(delete)s AND {scope} THEN excluded.guild_id ELSE webhooks.guild_id END, "
+            f"token=CASE WHEN %(delete)s AND {scope} THEN excluded.token ELSE webhooks.token END, "
+            f"user_id=CASE WHEN %(delete)s AND {scope} THEN excluded.user_id ELSE webhooks.user_id END",
+            parameters={
+                **parameters,
+                "delete": delete,
+                "webhook_ids": [webhook.id for webhook in webhooks],
+                "guild_ids": [webhook.guild_id for webhook in webhooks],
+                "channel_ids": [webhook.channel_id for webhook in webhooks],
+                "tokens": [webhook.token for webhook in webhooks],
+                "names": [webhook.name for webhook in webhooks],
+                "user_ids": [_webhook_user_id(webhook) for webhook in webhooks],
+            },
+        )
+
+
+def _webhook_user_id(webhook: DiscordWebhook) -> Optional[int]:
+    try:
+        return webhook.user_id
+    except AttributeError:
+        return webhook.user and webhook.user.id
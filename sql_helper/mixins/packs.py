@@ -14,9 +14,8 @@ class PacksMixin(_PostgresConnection):
 
     @async_list
     async def all_packs(self):
-        await self.cur.execute("SELECT * from packs")
-        packs = await self.cur.fetchall()
-        return [Pack(*p) for p in packs]
+        async for pack in self._stream("SELECT * from packs"):
+            yield Pack(*pack)
 
     @async_list
     async def user_pack_ids(self, user_id: Union[User, int]) -> AsyncList:
@@ -40,6 +39,14 @@ class PacksMixin(_PostgresConnection):
 
     @async_list
     async def get_packs_with_emoji(self, emote_id: int) -> AsyncList:
+        emote_hash = self._cached_emote_hash(emote_id)
+        if emote_hash is not None:
+            await self.cur.execute(
+                "select packs.pack_name from emote_ids join packs on emote_ids.guild_id=packs.guild_id where emote_ids.emote_hash=%(emote_hash)s limit 100",
+                parameters={"emote_hash": emote_hash},
+            )
+            packs = await self.cur.fetchall()
+            return [pack_name for pack_name, in packs]
         await self.cur.execute(
             "select packs.pack_name from emote_ids join packs on emote_ids.guild_id=packs.guild_id where emote_ids.emote_hash=(SELECT emote_hash FROM emote_ids WHERE emote_id=%(emote_id)s) limit 100",
             parameters={"emote_id": emote_id},
@@ -17,11 +17,10 @@ class PersonasMixin(_PostgresConnection):
 
     @async_list
     async def all_personas(self) -> AsyncList:
-        await self.cur.execute(
+        async for persona in self._stream(
             "SELECT user_id, short_name, display_name, avatar_url FROM personas"
-        )
-        personas = await self.cur.fetchall()
-        return [Persona(*i) for i in personas]
+        ):
+            yield Persona(*persona)
 
     async def get_persona(self, user_id: int, name: str) -> Optional[Persona]:
         await self.cur.execute(
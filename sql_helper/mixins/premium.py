@@ -1,6 +1,7 @@
 from typing import Optional, List
 from ..guild_feature import GuildFeature
 from ..premium_user import PremiumUser
+from ..guild_settings_cache import NOTIFY_CHANNEL
 
 from ..async_list import async_list
 from .._connection import _PostgresConnection
@@ -41,14 +42,19 @@ class PremiumMixin(_PostgresConnection):
             )
             if GuildFeature.USER_CONTENT in features:
                 await self.cur.execute(
-                    "UPDATE guild_settings SET enable_user_content=true WHERE guild_id=ANY(%(guild_ids)s)",
-                    parameters={"guild_ids": guild_ids},
+                    "WITH updated AS (UPDATE guild_settings SET enable_user_content=true WHERE guild_id=ANY(%(guild_ids)s) RETURNING guild_id) "
+                    "SELECT pg_notify(%(channel)s, guild_id::text) FROM updated",
+                    parameters={"guild_ids": guild_ids, "channel": NOTIFY_CHANNEL},
                 )
             if GuildFeature.EMOTE_ROLES in features:
                 await self.cur.execute(
-                    "UPDATE guild_settings SET nitro_role=null WHERE guild_id=ANY(%(guild_ids)s)",
-                    parameters={"guild_ids": guild_ids},
+                    "WITH updated AS (UPDATE guild_settings SET nitro_role=null WHERE guild_id=ANY(%(guild_ids)s) RETURNING guild_id) "
+                    "SELECT pg_notify(%(channel)s, guild_id::text) FROM updated",
+                    parameters={"guild_ids": guild_ids, "channel": NOTIFY_CHANNEL},
                 )
+            if self.guild_settings_cache is not None:
+                for guild_id in guild_ids:
+                    self.guild_settings_cache.invalidate(guild_id)
 
     async def set_premium_user_discord_override(self, member_id: str, discord_id: int):
         await self.cur.execute(
@@ -0,0 +1,10 @@
+from typing import Optional
+
+from .expiring_cache import ExpiringCache
+
+
+class MutualGuildsCache(ExpiringCache):
+    # user_id to a frozenset of the guild_ids they share with the bot.
+    # Writes through this process pop a user, max_age bounds how stale other processes' writes leave it.
+    def __init__(self, maxsize: int = 10000, max_age: Optional[float] = 300.0):
+        super().__init__(maxsize, max_age)
@@ -0,0 +1,166 @@
+from itertools import combinations
+from math import comb
+from typing import Dict, List, Optional, Set, Tuple, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .connection import SQLConnection
+
+
+def _parse(emote_hash: Optional[str]) -> Optional[int]:
+    if not emote_hash:
+        return None
+    try:
+        return int(emote_hash, 16)
+    except ValueError:
+        return None
+
+
+class PerceptualIndex:
+    # Multi-index hashing over emote_hash by Hamming distance, to find near duplicates rather than only exact matches.
+    # The bits of each hash are split into bands, each with a table from that band's value to the hashes having it.
+    # Two hashes within max_distance bits of each other differ by at most max_distance // bands bits in some band,
+    # so only those table entries are candidates. Searches up to bands - 1 bits away are exact lookups.
+    # Bands of around log2(len) bits keep the candidates few, three suits 64 bit hashes up to a few million emotes.
+    # Hashes longer than bits are kept aside and compared one by one.
+    def __init__(self, bits: int = 64, bands: int = 3):
+        self.loaded = False
+        self.bits = bits
+        self.bands = bands
+        # (shift, width) of each band, the first ones taking any bits left over
+        self._bands: List[Tuple[int, int]] = []
+        shift = 0
+        for band in range(bands):
+            width = bits // bands + (band < bits % bands)
+            self._bands.append((shift, width))
+            shift += width
+        self._tables: List[Dict[int, Set[int]]] = [{} for _ in range(bands)]
+        self._overflow: Set[int] = set()
+        self._emote_ids: Dict[int, Set[int]] = {}
+        self._hashes: Dict[int, int] = {}
+        # Changes made while load() runs, replayed over the new index before it's swapped in
+        self._pending: Optional[List[Tuple[int, Optional[str]]]] = None
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+    def __contains__(self, emote_id: int) -> bool:
+        return emote_id in self._hashes
+
+    def add(self, emote_id: int, emote_hash: Optional[str]):
+        if self._pending is not None:
+            self._pending.append((emote_id, emote_hash))
+        value = _parse(emote_hash)
+        previous = self._hashes.get(emote_id)
+        if previous is not None:
+            if previous == value:
+                return
+            self._discard(emote_id)
+        if value is None:
+            return
+        emote_ids = self._emote_ids.get(value)
+        if emote_ids is None:
+            emote_ids = self._emote_ids[value] = set()
+            if value.bit_length() > self.bits:
+                self._overflow.add(value)
+            else:
+                for table, (shift, width) in zip(self._tables, self._bands):
+                    table.setdefault((value >> shift) & ((1 << width) - 1), set()).add(
+                        value
+                    )
+        emote_ids.add(emote_id)
+        self._hashes[emote_id] = value
+
+    def remove(self, emote_id: int):
+        if self._pending is not None:
+            self._pending.append((emote_id, None))
+        self._discard(emote_id)
+
+    def _discard(self, emote_id: int):
+        # A hash no emote has any more is taken out of every table, so churn doesn't leave anything behind
+        value = self._hashes.pop(emote_id, None)
+        if value is None:
+            return
+        emote_ids = self._emote_ids[value]
+        emote_ids.discard(emote_id)
+        if emote_ids:
+            return
+        del self._emote_ids[value]
+        if value in self._overflow:
+            self._overflow.discard(value)
+            return
+        for table, (shift, width) in zip(self._tables, self._bands):
+            key = (value >> shift) & ((1 << width) - 1)
+            values = table[key]
+            values.discard(value)
+            if not values:
+                del table[key]
+
+    def search(self, emote_hash: str, max_distance: int) -> List[Tuple[int, int]]:
+        # (emote_id, distance) for every emote within max_distance bits, closest first
+        value = _parse(emote_hash)
+        if value is None or not self._hashes:
+            return []
+        band_distance = max_distance // self.bands
+        probes = sum(
+            comb(width, count)
+            for _, width in self._bands
+            for count in range(min(band_distance, width) + 1)
+        )
+        if probes >= len(self._emote_ids):
+            # Wide enough that looking at every hash is cheaper
+            candidates = self._emote_ids.keys()
+        else:
+            candidates = set(self._overflow)
+            for table, (shift, width) in zip(self._tables, self._bands):
+                key = (value >> shift) & ((1 << width) - 1)
+                for mask in _masks(width, band_distance):
+                    values = table.get(key ^ mask)
+                    if values is not None:
+                        candidates |= values
+        results = []
+        for candidate in candidates:
+            distance = (candidate ^ value).bit_count()
+            if distance <= max_distance:
+                results.extend(
+                    (emote_id, distance) for emote_id in self._emote_ids[candidate]
+                )
+        results.sort(key=lambda result: (result[1], result[0]))
+        return results
+
+    async def load(self, sql: "SQLConnection", batch_size: int = 10000):
+        # Pages through get_all_emotes_min, a fresh connection per page. The new index is built off to the side
+        # and swapped in once complete, so a reload keeps serving searches from the old one.
+        index = PerceptualIndex(self.bits, self.bands)
+        self._pending = []
+        try:
+            min_id = 0
+            while True:
+                async with sql() as conn:
+                    emotes = await conn.get_all_emotes_min(min_id, batch_size)
+                for emote in emotes:
+                    index.add(emote.emote_id, emote.emote_hash)
+                if len(emotes) < batch_size:
+                    break
+                min_id = emotes[-1].emote_id
+            for emote_id, emote_hash in self._pending:
+                index.add(emote_id, emote_hash)
+        finally:
+            self._pending = None
+        self._tables, self._overflow = index._tables, index._overflow
+        self._emote_ids, self._hashes = index._emote_ids, index._hashes
+        self.loaded = True
+
+
+_mask_cache: Dict[Tuple[int, int], List[int]] = {}
+
+
+def _masks(width: int, max_bits: int) -> List[int]:
+    # Every mask of width bits with at most max_bits set
+    masks = _mask_cache.get((width, max_bits))
+    if masks is None:
+        masks = _mask_cache[(width, max_bits)] = [
+            sum(1 << bit for bit in bits)
+            for count in range(min(max_bits, width) + 1)
+            for bits in combinations(range(width), count)
+        ]
+    return masks
@@ -0,0 +1,69 @@
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from typing import Callable, Optional, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .connection import SQLConnection
+
+log = logging.getLogger(__name__)
+
+
+@dataclass
+class DecayCheckpoint:
+    # Persist this to pick a run back up where it stopped.
+    last_emote_id: int = 0
+    rows_touched: int = 0
+    chunks: int = 0
+    done: bool = False
+
+
+@dataclass
+class ScoreDecay:
+    # Decays emote scores a chunk of emote_ids at a time, with a fresh connection per chunk
+    # so neither locks nor pool connections are held between chunks.
+    sql: "SQLConnection"
+    chunk_size: int = 1000
+    delay: float = 0.0
+    checkpoint: DecayCheckpoint = field(default_factory=DecayCheckpoint)
+    on_progress: Optional[Callable[[DecayCheckpoint], None]] = None
+
+    def __post_init__(self):
+        self._running = asyncio.Event()
+        self._running.set()
+
+    @property
+    def paused(self) -> bool:
+        return not self._running.is_set()
+
+    def pause(self):
+        # Takes effect after the chunk in flight
+        self._running.clear()
+
+    def resume(self):
+        self._running.set()
+
+    async def run(self) -> DecayCheckpoint:
+        checkpoint = self.checkpoint
+        while not checkpoint.done:
+            await self._running.wait()
+            async with self.sql() as conn:
+                last_emote_id, touched = await conn.decay_guild_emote_score_chunk(
+                    checkpoint.last_emote_id, self.chunk_size
+                )
+            checkpoint.chunks += 1
+            checkpoint.rows_touched += touched
+            if last_emote_id is None:
+                checkpoint.done = True
+            else:
+                checkpoint.last_emote_id = last_emote_id
+            log.debug(
+                "Decayed %s emote scores up to emote_id %s",
+                checkpoint.rows_touched,
+                checkpoint.last_emote_id,
+            )
+            if self.on_progress is not None:
+                self.on_progress(checkpoint)
+            if self.delay and not checkpoint.done:
+                await asyncio.sleep(self.delay)
+        return checkpoint
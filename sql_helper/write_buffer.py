@@ -0,0 +1,175 @@
+import asyncio
+import logging
+import time
+from collections import Counter
+from datetime import datetime
+from typing import List, Optional, Tuple, Union, TYPE_CHECKING
+
+from discord import PartialEmoji
+
+from .guild_message import GuildMessage
+
+if TYPE_CHECKING:
+    from .connection import SQLConnection
+    from .metrics import WriteBufferMetrics
+
+log = logging.getLogger(__name__)
+
+
+class WriteBuffer:
+    # Collects the per-message single row writes and flushes them as bulk statements
+    # once max_size writes are waiting, or every flush_interval seconds.
+    # Adding to a full buffer waits for the flush, so memory stays bounded.
+    # A batch that fails to flush is retried on its own on later flushes, up to max_retries times. After that it's
+    # split in half and each half tried again, until a bad row is alone and dropped. Up to max_size rows are kept
+    # for retrying, anything past that is dropped. Dropped rows are logged and counted.
+    def __init__(
+        self,
+        sql: "SQLConnection",
+        *,
+        max_size: int = 1000,
+        flush_interval: float = 1.0,
+        max_retries: int = 3,
+        metrics: Optional["WriteBufferMetrics"] = None,
+    ):
+        self.sql = sql
+        self.max_size = max_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.metrics = metrics
+        self._guild_messages: List[GuildMessage] = []
+        self._command_messages: List[Tuple[int, int]] = []
+        self._used_emotes: List[Tuple[int, PartialEmoji, datetime]] = []
+        self._emote_scores = Counter()
+        # (connection method, batch, attempts) for each batch waiting to be retried
+        self._failed: List[Tuple[str, Union[list, Counter], int]] = []
+        self._lock = asyncio.Lock()
+        self._closing = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return (
+            len(self._guild_messages)
+            + len(self._command_messages)
+            + len(self._used_emotes)
+            + len(self._emote_scores)
+        )
+
+    async def add_guild_message(
+        self, *, message_id: int, guild_id: int, channel_id: int, user_id: int
+    ):
+        self._guild_messages.append(
+            GuildMessage(guild_id, channel_id, message_id, user_id)
+        )
+        await self._added()
+
+    async def add_command_message(self, *, message_id: int, user_id: int):
+        self._command_messages.append((message_id, user_id))
+        await self._added()
+
+    async def add_used_emotes(self, to_cache: List[Tuple[int, PartialEmoji, datetime]]):
+        self._used_emotes.extend(to_cache)
+        await self._added()
+
+    async def increment_guild_emote_score(self, emoji_guild_ids: List[Tuple[int, int]]):
+        # A pair repeated within one message counts once, like the unbuffered increment
+        self._emote_scores.update(set(emoji_guild_ids))
+        await self._added()
+
+    def start(self):
+        if self._task is None:
+            self._closing.clear()
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        # Flush anything left, call on shutdown. A periodic flush in progress is waited for rather than cancelled,
+        # it has already taken its rows out of the buffer.
+        if self._task is not None:
+            self._closing.set()
+            await self._task
+            self._task = None
+        await self.flush()
+        # Nothing will retry what's left
+        failed, self._failed = self._failed, []
+        for method, batch, _ in failed:
+            self._drop(method, batch)
+
+    async def flush(self):
+        # Each table is written on its own, so one failing doesn't lose the others. Errors are logged, not raised.
+        async with self._lock:
+            # Retries are kept apart from new rows, so one bad row can't fail every later flush of its table.
+            # They go first so, when there's no room to keep everything, it's the newer rows that are dropped.
+            batches = self._failed + [
+                ("ingest_guild_messages", self._guild_messages, 0),
+                ("add_command_messages_bulk", self._command_messages, 0),
+                ("add_used_emotes", self._used_emotes, 0),
+                ("apply_guild_emote_score_uses", self._emote_scores, 0),
+            ]
+            self._guild_messages = []
+            self._command_messages = []
+            self._used_emotes = []
+            self._emote_scores = Counter()
+            self._failed = []
+            start_time = time.perf_counter()
+            for method, batch, attempts in batches:
+                if not batch:
+                    continue
+                try:
+                    async with self.sql() as conn:
+                        await getattr(conn, method)(batch)
+                except Exception:
+                    log.exception("Failed to flush %s rows with %s", len(batch), method)
+                    self._retry(method, batch, attempts + 1)
+            self._observe_depth()
+            if self.metrics is not None:
+                self.metrics.flush.observe(time.perf_counter() - start_time)
+
+    def _retry(self, method: str, batch: Union[list, Counter], attempts: int):
+        if attempts <= self.max_retries:
+            self._queue(method, batch, attempts)
+        elif len(batch) == 1:
+            self._drop(method, batch)
+        else:
+            # Each half gets one more try before it's split again
+            for half in _halves(batch):
+                self._queue(method, half, self.max_retries)
+
+    def _queue(self, method: str, batch: Union[list, Counter], attempts: int):
+        # Capped, so an outage can't grow the buffer without bound
+        if self._failed_rows() + len(batch) > self.max_size:
+            self._drop(method, batch)
+        else:
+            self._failed.append((method, batch, attempts))
+
+    def _drop(self, method: str, batch: Union[list, Counter]):
+        log.error("Dropping %s rows for %s after failing to flush", len(batch), method)
+        if self.metrics is not None:
+            self.metrics.dropped.labels(method=method).inc(len(batch))
+
+    def _failed_rows(self) -> int:
+        return sum(len(batch) for _, batch, _ in self._failed)
+
+    async def _added(self):
+        self._observe_depth()
+        if len(self) >= self.max_size:
+            await self.flush()
+
+    async def _run(self):
+        while not self._closing.is_set():
+            try:
+                await asyncio.wait_for(self._closing.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                await self.flush()
+
+    def _observe_depth(self):
+        if self.metrics is not None:
+            self.metrics.depth.set(len(self) + self._failed_rows())
+
+
+def _halves(batch: Union[list, Counter]) -> Tuple[Union[list, Counter], ...]:
+    if isinstance(batch, Counter):
+        items = list(batch.items())
+        middle = len(items) // 2
+        return Counter(dict(items[:middle])), Counter(dict(items[middle:]))
+    middle = len(batch) // 2
+    return batch[:middle], batch[middle:]
@@ -0,0 +1,26 @@
+import pytest
+
+from sql_helper.async_list import async_list
+
+
+@async_list
+async def _list():
+    return [1, 2, 3]
+
+
+@async_list
+async def _generator():
+    for i in (1, 2, 3):
+        yield i
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("f", [_list, _generator])
+async def test_async_list_await(f):
+    assert await f() == [1, 2, 3]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("f", [_list, _generator])
+async def test_async_list_iterate(f):
+    assert [i async for i in f()] == [1, 2, 3]
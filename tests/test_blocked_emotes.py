@@ -0,0 +1,73 @@
+import pytest
+
+from sql_helper import BlockedEmotesIndex
+from .base import *
+
+
+@pytest.fixture
+def indexed_postgres(postgres):
+    postgres.blocked_emotes_index = BlockedEmotesIndex()
+    postgres.blocked_emotes_index.load([(1, 10, "a"), (1, 11, "b"), (2, 20, None)])
+    return postgres
+
+
+def test_blocked_emotes_index_remove():
+    index = BlockedEmotesIndex()
+    index.load([(1, 10, "a"), (1, 11, "a")])
+    index.remove(1, 10)
+    assert index.blocked_hashes(1, {12: "a"}) == [12]
+    index.remove(1, 11)
+    assert not index.has_blocks(1)
+    assert index.blocked_hashes(1, {12: "a"}) == []
+
+
+def test_blocked_emotes_index_refresh():
+    index = BlockedEmotesIndex()
+    index.load([(1, 10, "a"), (2, 20, "b")])
+    index.refresh([1, 3], [(3, 30, "c")])
+    assert sorted(index.guild_ids()) == [2, 3]
+
+
+@pytest.mark.asyncio
+async def test_has_blocked_emotes_no_blocks(indexed_postgres):
+    assert not await indexed_postgres.has_blocked_emotes(3, [10])
+    assert indexed_postgres.cur.execute.call_count == 0
+
+
+@pytest.mark.asyncio
+async def test_has_blocked_emotes_by_id(indexed_postgres):
+    assert await indexed_postgres.has_blocked_emotes(1, [5, 10])
+    assert indexed_postgres.cur.execute.call_count == 0
+
+
+@pytest.mark.asyncio
+async def test_has_blocked_emotes_by_hash(indexed_postgres):
+    indexed_postgres.cur.fetchall.side_effect = [[(5, "x")], [(6, "b")]]
+    assert not await indexed_postgres.has_blocked_emotes(1, [5])
+    assert await indexed_postgres.has_blocked_emotes(1, [6])
+    assert indexed_postgres.cur.execute.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_emotes_blocked(indexed_postgres):
+    indexed_postgres.cur.fetchall.side_effect = [[(5, "x"), (6, "b"), (10, "a")]]
+    assert sorted(await indexed_postgres.emotes_blocked(1, [5, 6, 10])) == [6, 10]
+    assert await indexed_postgres.emotes_blocked(3, [5, 6, 10]) == []
+    assert indexed_postgres.cur.execute.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_block_unblock_emotes(indexed_postgres):
+    indexed_postgres.cur.fetchall.side_effect = [[(3, 30, "c", "")]]
+    await indexed_postgres.block_emotes(3, [])
+    assert await indexed_postgres.has_blocked_emotes(3, [30])
+    assert not await indexed_postgres.unblock_emote(3, 30)
+    assert not await indexed_postgres.has_blocked_emotes(3, [30])
+    assert indexed_postgres.cur.execute.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_load_blocked_emotes_index_without_index(postgres):
+    await postgres.load_blocked_emotes_index()
+    await postgres.load_blocked_emotes_index([1])
+    postgres.cur.execute.assert_not_called()
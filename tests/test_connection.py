@@ -0,0 +1,147 @@
+import pytest
+from mock import MagicMock, AsyncMock
+from psycopg2.extensions import TRANSACTION_STATUS_INERROR
+
+from sql_helper import SQLConnection
+
+
+@pytest.fixture
+def pool():
+    cur = MagicMock()
+    cur.execute = AsyncMock()
+    cur.fetchall = AsyncMock(return_value=[(1,)])
+    conn = MagicMock()
+    conn.cursor.return_value.__aenter__.return_value = cur
+    pool = MagicMock()
+    pool.acquire.return_value.__aenter__.return_value = conn
+    return pool
+
+
+@pytest.mark.asyncio
+async def test_eager_acquires(pool):
+    async with SQLConnection(pool)():
+        assert pool.acquire.call_count == 1
+    assert pool.acquire.return_value.__aexit__.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_lazy_never_acquires(pool):
+    async with SQLConnection(pool, lazy=True)():
+        pass
+    assert pool.acquire.call_count == 0
+    assert pool.acquire.return_value.__aexit__.call_count == 0
+
+
+@pytest.mark.asyncio
+async def test_lazy_acquires_on_execute(pool):
+    async with SQLConnection(pool, lazy=True)() as conn:
+        assert pool.acquire.call_count == 0
+        assert await conn.in_guild(user_id=1, guild_id=2)
+        assert await conn.in_guild(user_id=1, guild_id=2)
+        assert pool.acquire.call_count == 1
+    assert pool.acquire.return_value.__aexit__.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_lazy_acquires_on_begin(pool):
+    async with SQLConnection(pool, lazy=True)() as conn:
+        async with conn.cur.begin():
+            assert pool.acquire.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_stream_released_after_failed_transaction(pool):
+    conn = pool.acquire.return_value.__aenter__.return_value
+    cur = conn.cursor.return_value.__aenter__.return_value
+    cur.fetchall.return_value = [(1, "!"), (2, "?")]
+    with pytest.raises(ValueError):
+        async with SQLConnection(pool, stream_batch_size=2)() as sql:
+            async for _ in sql.guild_prefixes():
+                break
+            conn.raw.get_transaction_status.return_value = TRANSACTION_STATUS_INERROR
+            raise ValueError
+    # The aborted transaction already dropped the cursor, so it isn't closed again
+    assert not any(
+        call.args[0].startswith("CLOSE") for call in cur.execute.call_args_list
+    )
+    assert conn.cursor.return_value.__aexit__.call_count == 1
+    assert pool.acquire.return_value.__aexit__.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_unlabelled_without_pool_metrics(pool, monkeypatch):
+    method = MagicMock()
+    monkeypatch.setattr("sql_helper._connection._method", method)
+    async with SQLConnection(pool)() as conn:
+        await conn.in_guild(user_id=1, guild_id=2)
+        async for _ in conn.guild_prefixes():
+            pass
+    method.set.assert_not_called()
+
+
+@pytest.fixture
+def registry():
+    # prometheus_client and sentry_sdk are optional, sql_helper.metrics needs both
+    prometheus_client = pytest.importorskip("prometheus_client")
+    pytest.importorskip("sentry_sdk")
+    return prometheus_client.CollectorRegistry()
+
+
+@pytest.fixture
+def pool_metrics(registry):
+    from sql_helper.metrics import PoolMetrics
+
+    return PoolMetrics("test", registry=registry)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("lazy", [False, True])
+async def test_pool_metrics(pool, registry, pool_metrics, lazy: bool):
+    pool.size = 5
+    pool.freesize = 3
+    async with SQLConnection(pool, pool_metrics=pool_metrics, lazy=lazy)() as conn:
+        await conn.in_guild(user_id=1, guild_id=2)
+        await conn.mutual_guild_ids(1)
+    for histogram in ("test_sql_pool_hold_seconds", "test_sql_pool_acquire_seconds"):
+        assert (
+            registry.get_sample_value(
+                f"{histogram}_count",
+                {"isolation_level": "default", "method": "in_guild"},
+            )
+            == 1
+        )
+    assert registry.get_sample_value("test_sql_pool_in_use") == 2
+    for method in ("in_guild", "mutual_guild_ids"):
+        assert (
+            registry.get_sample_value(
+                "test_sql_query_seconds_count",
+                {"isolation_level": "default", "method": method},
+            )
+            == 1
+        )
+
+
+@pytest.mark.asyncio
+async def test_pool_metrics_labels_outermost_method(pool, registry, pool_metrics):
+    pool.size = 5
+    pool.freesize = 3
+    async with SQLConnection(pool, pool_metrics=pool_metrics)() as conn:
+        # mutual_guilds runs its query through mutual_guild_ids
+        await conn.mutual_guilds(1)
+        async for _ in conn.guild_prefixes():
+            pass
+    for method in ("mutual_guilds", "guild_prefixes"):
+        assert (
+            registry.get_sample_value(
+                "test_sql_query_seconds_count",
+                {"isolation_level": "default", "method": method},
+            )
+            == 1
+        )
+    assert (
+        registry.get_sample_value(
+            "test_sql_query_seconds_count",
+            {"isolation_level": "default", "method": "mutual_guild_ids"},
+        )
+        is None
+    )
@@ -0,0 +1,51 @@
+import pytest
+
+from sql_helper import EmojiColumns, SQLEmoji
+from .base import *
+
+ROWS = [
+    SQLEmoji(1, "aa", True, False, "s1", 10, "one", False),
+    SQLEmoji(2, "aa", False, True, "s1", None, "one", True),
+    SQLEmoji(3, "bb", None, False, None, 11, None, False),
+    SQLEmoji(4, "cc", True, True, "s2", 10, "four", True),
+]
+
+
+def test_round_trip():
+    columns = EmojiColumns.from_rows(ROWS)
+    assert len(columns) == 4
+    assert list(columns) == ROWS
+    assert columns[2] == ROWS[2]
+    assert list(columns.emote_ids) == [1, 2, 3, 4]
+
+
+def test_filter():
+    columns = EmojiColumns.from_rows(ROWS)
+    assert list(columns.filter(usable=True)) == [ROWS[0], ROWS[3]]
+    assert list(columns.filter(usable=False)) == [ROWS[1]]
+    assert list(columns.filter(usable=True, has_roles=False)) == [ROWS[0]]
+    assert list(columns.filter(animated=True)) == [ROWS[1], ROWS[3]]
+    assert list(columns.filter()) == ROWS
+    filtered = columns.filter(has_roles=False)
+    filtered.append(ROWS[3])
+    assert list(filtered) == [ROWS[0], ROWS[2], ROWS[3]]
+
+
+def test_filter_does_not_share_names():
+    columns = EmojiColumns.from_rows(ROWS)
+    names = list(columns._names)
+    filtered = columns.filter(usable=True)
+    filtered.append(ROWS[0]._replace(emote_id=5, name="new_name"))
+    assert columns._names == names
+    assert "new_name" not in columns._name_index
+    assert list(columns) == ROWS
+    assert filtered[-1].name == "new_name"
+
+
+@pytest.mark.asyncio
+async def test_get_all_emotes_min_columnar(postgres):
+    postgres.cur.fetchall.return_value = [tuple(row) for row in ROWS]
+    columns = await postgres.get_all_emotes_min(0, 10, columnar=True)
+    assert isinstance(columns, EmojiColumns)
+    assert list(columns.filter(usable=True, has_roles=False)) == [ROWS[0]]
+    assert await postgres.get_all_emotes_min(0, 10) == ROWS
@@ -0,0 +1,43 @@
+from datetime import datetime, timezone
+
+import pytest
+from discord import PartialEmoji
+
+from .base import *
+
+
+@pytest.mark.asyncio
+async def test_ingest_used_emotes(postgres):
+    now = datetime.now(timezone.utc)
+    to_cache = (
+        (1, PartialEmoji(name=f"emote{i}", id=i, animated=i % 2 == 0), now)
+        for i in range(5)
+    )
+    await postgres.ingest_used_emotes(to_cache, chunk_size=2)
+    assert postgres.cur.execute.call_count == 3
+    first, _, last = postgres.cur.execute.call_args_list
+    assert "unnest(%(times)s," in first.args[0]
+    assert first.kwargs["parameters"] == {
+        "times": [now, now],
+        "guild_ids": [1, 1],
+        "names": ["emote0", "emote1"],
+        "ids": [0, 1],
+        "animateds": [True, False],
+    }
+    assert last.kwargs["parameters"]["ids"] == [4]
+
+
+@pytest.mark.asyncio
+async def test_ingest_used_emotes_naive_times(postgres):
+    # Passed through untouched, so they're read the same way add_used_emotes reads them
+    now = datetime.now()
+    await postgres.ingest_used_emotes([(1, PartialEmoji(name="a", id=1), now)])
+    query = postgres.cur.execute.call_args.args[0]
+    assert "timestamptz" not in query
+    assert postgres.cur.execute.call_args.kwargs["parameters"]["times"] == [now]
+
+
+@pytest.mark.asyncio
+async def test_ingest_used_emotes_empty(postgres):
+    await postgres.ingest_used_emotes(iter([]))
+    assert postgres.cur.execute.call_count == 0
@@ -0,0 +1,112 @@
+import asyncio
+
+import pytest
+from mock import MagicMock, AsyncMock
+
+from sql_helper import EmoteScanner, ScanCheckpoint
+from sql_helper.emote_scanner import ScanRange, _split
+from .base import *
+
+EMOTE_IDS = [3, 5, 8, 13, 21, 34, 55, 89, 144, 233]
+
+
+@pytest.fixture
+def conn():
+    conn = AsyncMock()
+    conn.emote_id_bounds.return_value = (EMOTE_IDS[0], EMOTE_IDS[-1])
+    conn.in_flight = 0
+    conn.max_in_flight = 0
+
+    async def get_emotes_in_range(min_id, max_id, limit):
+        conn.in_flight += 1
+        conn.max_in_flight = max(conn.max_in_flight, conn.in_flight)
+        await asyncio.sleep(0)
+        conn.in_flight -= 1
+        emote_ids = [i for i in EMOTE_IDS if min_id < i <= max_id][:limit]
+        return [get_sql_emoji(i) for i in emote_ids]
+
+    conn.get_emotes_in_range.side_effect = get_emotes_in_range
+    return conn
+
+
+@pytest.fixture
+def sql(conn):
+    sql = MagicMock()
+    sql.return_value.__aenter__.return_value = conn
+    return sql
+
+
+async def scanned(scanner: EmoteScanner):
+    return [[emote.emote_id for emote in batch] async for batch in scanner]
+
+
+@pytest.mark.asyncio
+async def test_scan_ordered(sql, conn):
+    scanner = EmoteScanner(sql, ranges=4, concurrency=2, batch_size=2, ordered=True)
+    batches = await scanned(scanner)
+    assert sum(batches, []) == EMOTE_IDS
+    assert all(len(batch) <= 2 for batch in batches)
+    assert conn.max_in_flight == 2
+    assert scanner.checkpoint.done
+
+
+@pytest.mark.asyncio
+async def test_scan_unordered(sql):
+    scanner = EmoteScanner(sql, ranges=3, batch_size=2)
+    assert sorted(sum(await scanned(scanner), [])) == EMOTE_IDS
+    assert [r.end for r in scanner.checkpoint.ranges] == [79, 156, 233]
+    assert all(r.done for r in scanner.checkpoint.ranges)
+
+
+def test_split():
+    assert _split(2, 233, 3) == [
+        ScanRange(2, 79),
+        ScanRange(79, 156),
+        ScanRange(156, 233),
+    ]
+    assert _split(2, 3, 8) == [ScanRange(2, 3)]
+
+
+@pytest.mark.asyncio
+async def test_scan_resume(sql, conn):
+    checkpoint = ScanCheckpoint([ScanRange(2, 50, done=True), ScanRange(89, 233)])
+    scanner = EmoteScanner(sql, ordered=True, checkpoint=checkpoint)
+    assert await scanned(scanner) == [[144, 233]]
+    conn.emote_id_bounds.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_scan_interrupted(sql):
+    scanner = EmoteScanner(sql, ranges=1, batch_size=3, ordered=True)
+    async for batch in scanner:
+        break
+    assert scanner.checkpoint.ranges[0].start == 2
+    async for batch in scanner:
+        # Not marked as handed out until the next batch was asked for
+        assert [emote.emote_id for emote in batch] == [3, 5, 8]
+        break
+
+
+@pytest.mark.asyncio
+async def test_scan_closed_waits_for_tasks(sql):
+    scanner = EmoteScanner(sql, ranges=4, batch_size=1)
+    scan = scanner.scan()
+    await scan.__anext__()
+    await scan.aclose()
+    assert (
+        sql.return_value.__aexit__.await_count
+        == sql.return_value.__aenter__.await_count
+    )
+
+
+@pytest.mark.asyncio
+async def test_scan_empty(sql, conn):
+    conn.emote_id_bounds.return_value = (None, None)
+    assert await scanned(EmoteScanner(sql)) == []
+
+
+@pytest.mark.asyncio
+async def test_scan_error(sql, conn):
+    conn.get_emotes_in_range.side_effect = ValueError
+    with pytest.raises(ValueError):
+        await scanned(EmoteScanner(sql))
@@ -0,0 +1,53 @@
+import random
+
+import pytest
+
+from sql_helper.emote_scores import apply_uses, increment_probability
+from .base import *
+
+
+@pytest.mark.parametrize(
+    "score, probability",
+    [(-128, 1), (-97, 1), (-96, 1 / 2), (-1, 1 / 8), (0, 1 / 16), (127, 1 / 128)],
+)
+def test_increment_probability(score: int, probability: float):
+    assert increment_probability(score) == probability
+
+
+def test_apply_uses():
+    assert apply_uses(-128, 10) == -118
+    assert apply_uses(0, 10, rand=lambda: 0) == 10
+    assert apply_uses(0, 10, rand=lambda: 0.99) == 0
+    assert apply_uses(120, 100, rand=lambda: 0) == 127
+
+
+def test_apply_uses_matches_sequential():
+    # Aggregating uses must follow the same curve as one increment per use
+    rng = random.Random(1)
+    aggregated = [apply_uses(-100, 200, rng.random) for _ in range(200)]
+    rng = random.Random(1)
+    sequential = []
+    for _ in range(200):
+        score = -100
+        for _ in range(200):
+            score = apply_uses(score, 1, rng.random)
+        sequential.append(score)
+    assert aggregated == sequential
+
+
+@pytest.mark.asyncio
+async def test_apply_guild_emote_score_uses(postgres):
+    postgres.cur.fetchall.side_effect = [[(1, 10, -128), (1, 11, 127)]]
+    await postgres.apply_guild_emote_score_uses({(1, 10): 3, (1, 11): 5, (1, 12): 1})
+    assert postgres.cur.execute.call_count == 2
+    assert postgres.cur.execute.call_args.kwargs["parameters"] == {
+        "guild_ids": [1],
+        "emote_ids": [10],
+        "deltas": [3],
+    }
+
+
+@pytest.mark.asyncio
+async def test_apply_guild_emote_score_uses_empty(postgres):
+    await postgres.apply_guild_emote_score_uses({})
+    assert postgres.cur.execute.call_count == 0
@@ -4,7 +4,9 @@ import pytest
 from hypothesis import given, settings, HealthCheck, assume
 from hypothesis.strategies import lists, sampled_from, booleans
 
-from sql_helper import SQLEmoji
+from sql_helper import SQLEmoji, EmoteHashCache
+from sql_helper.emoji import EmoteGuildUpdate
+from sql_helper.mixins.emojis import EmoteScope
 from .base import *
 
 
@@ -229,3 +231,214 @@ async def test_get_emote_like(
     else:
         assert rtn.emote_hash == to_find.emote_hash
         assert rtn.usable
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "result",
+    [None, get_sql_emoji(1, name="test"), get_sql_emoji(2, name="Test")],
+)
+async def test_case_insensitive_get_emote_ranked(postgres, result: Optional[SQLEmoji]):
+    postgres.ranked_emote_lookup = True
+    postgres.cur.fetchall.side_effect = [[] if result is None else [("test", *result)]]
+    rtn = await postgres._case_insensitive_get_emote(
+        query_where="guild_id=%(guild_id)s",
+        emote_name="test",
+        parameters={"guild_id": 123},
+    )
+    assert rtn == result
+    assert postgres.cur.execute.call_count == 1
+    query = postgres.cur.execute.call_args.args[0]
+    assert "where guild_id=%(guild_id)s and has_roles=false" in query
+    assert postgres.cur.execute.call_args.kwargs["parameters"] == {
+        "guild_id": 123,
+        "emote_names": ["test"],
+    }
+
+
+@pytest.mark.asyncio
+async def test_get_emotes_by_name_empty(postgres):
+    rtn = await postgres.get_emotes_by_name(EmoteScope.guild, 123, [])
+    assert rtn == {}
+    assert postgres.cur.execute.call_count == 0
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("scope", list(EmoteScope))
+async def test_get_emotes_by_name(postgres, scope: EmoteScope):
+    postgres.cur.fetchall.side_effect = [
+        [
+            ("test", *get_sql_emoji(1, name="test")),
+            ("Foo", *get_sql_emoji(2, name="foo")),
+        ]
+    ]
+    rtn = await postgres.get_emotes_by_name(scope, 123, ["test", "Foo", "missing"])
+    assert rtn == {
+        "test": get_sql_emoji(1, name="test"),
+        "Foo": get_sql_emoji(2, name="foo"),
+    }
+    assert postgres.cur.execute.call_count == 1
+    assert postgres.cur.execute.call_args.kwargs["parameters"] == {
+        "scope": 123,
+        "emote_names": ["test", "Foo", "missing"],
+    }
+
+
+@pytest.mark.asyncio
+async def test_get_emotes_like_empty(postgres):
+    rtn = await postgres.get_emotes_like([])
+    assert rtn == {}
+    assert postgres.cur.execute.call_count == 0
+
+
+@pytest.mark.asyncio
+async def test_get_emotes_like_all_usable(postgres):
+    postgres.cur.fetchall.side_effect = [[get_sql_emoji(1), get_sql_emoji(2)]]
+    rtn = await postgres.get_emotes_like([1, 2, 3])
+    assert rtn == {1: get_sql_emoji(1), 2: get_sql_emoji(2), 3: None}
+    assert postgres.cur.fetchall.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_get_emotes_like_with_secondary(postgres):
+    postgres.cur.fetchall.side_effect = [
+        [
+            get_sql_emoji(1),
+            get_sql_emoji(2, emote_hash="2", usable=False),
+            get_sql_emoji(3, emote_hash="3", guild_id=None),
+            get_sql_emoji(4, emote_hash="4", usable=False),
+        ],
+        [get_sql_emoji(5, emote_hash="2"), get_sql_emoji(6, emote_hash="3")],
+    ]
+    rtn = await postgres.get_emotes_like([1, 2, 3, 4])
+    assert rtn == {
+        1: get_sql_emoji(1),
+        2: get_sql_emoji(5, emote_hash="2"),
+        3: get_sql_emoji(6, emote_hash="3"),
+        4: None,
+    }
+    assert postgres.cur.fetchall.call_count == 2
+    assert sorted(
+        postgres.cur.execute.call_args.kwargs["parameters"]["emote_hashes"]
+    ) == [
+        "2",
+        "3",
+        "4",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_get_emotes_like_no_require_guild(postgres):
+    postgres.cur.fetchall.side_effect = [[get_sql_emoji(1, guild_id=None)]]
+    rtn = await postgres.get_emotes_like([1], require_guild=False)
+    assert rtn == {1: get_sql_emoji(1, guild_id=None)}
+    assert postgres.cur.fetchall.call_count == 1
+
+
+@pytest.fixture
+def hash_cached_postgres(postgres):
+    postgres.emote_hash_cache = EmoteHashCache(10)
+    postgres.emote_hash_cache.set(1, "a")
+    return postgres
+
+
+@pytest.mark.asyncio
+async def test_get_emote_hashes_fetches_missing(hash_cached_postgres):
+    hash_cached_postgres.cur.fetchall.side_effect = [[(2, "b")]]
+    rtn = await hash_cached_postgres.get_emote_hashes([1, 2, 3])
+    assert rtn == {"a": 1, "b": 2}
+    assert hash_cached_postgres.cur.execute.call_args.kwargs["parameters"] == {
+        "emote_ids": [2, 3]
+    }
+    assert await hash_cached_postgres.get_emote_hash(2) == "b"
+    assert hash_cached_postgres.cur.execute.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_share_hashes_cached(hash_cached_postgres):
+    hash_cached_postgres.emote_hash_cache.set(2, "a")
+    hash_cached_postgres.emote_hash_cache.set(3, "b")
+    assert await hash_cached_postgres.share_hashes(1, 2)
+    assert not await hash_cached_postgres.share_hashes(1, 3)
+    assert hash_cached_postgres.cur.execute.call_count == 0
+
+
+@pytest.mark.asyncio
+async def test_cached_hash_skips_subquery(hash_cached_postgres):
+    hash_cached_postgres.cur.fetchall.side_effect = [[(5,)], [(7,)]]
+    assert await hash_cached_postgres.daily_scores_for_emotes(1) == [5]
+    assert await hash_cached_postgres.daily_scores_for_emotes(2) == [7]
+    first, second = hash_cached_postgres.cur.execute.call_args_list
+    assert first.kwargs["parameters"] == {"emote_hash": "a"}
+    assert second.kwargs["parameters"] == {"emote_id": 2}
+
+
+@pytest.mark.asyncio
+async def test_bulk_update_invalidates_hash_cache(hash_cached_postgres):
+    await hash_cached_postgres.bulk_update_emote_perceptual_hash_data(
+        [{"id": 1, "animated": False, "sha": "x", "perceptual": "z"}]
+    )
+    assert 1 not in hash_cached_postgres.emote_hash_cache
+
+
+@pytest.mark.asyncio
+async def test_set_emotes_perceptual_data(postgres):
+    await postgres.set_emotes_perceptual_data(
+        [get_sql_emoji(1, name="a"), get_sql_emoji(2), get_sql_emoji(1, name="b")]
+    )
+    parameters = postgres.cur.execute.call_args.kwargs["parameters"]
+    assert parameters["emote_ids"] == [1, 2]
+    assert parameters["names"] == ["b", get_sql_emoji(2).name]
+    postgres.cur.execute.reset_mock()
+    await postgres.set_emotes_perceptual_data([])
+    postgres.cur.execute.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_set_emotes_guild(postgres):
+    await postgres.set_emotes_guild(
+        [
+            EmoteGuildUpdate(1, 10, None, False, "a"),
+            EmoteGuildUpdate(2, None, True, True, "b"),
+        ]
+    )
+    query = postgres.cur.execute.call_args.args[0]
+    assert "coalesce(t.usable, emote_ids.usable)" in query
+    assert postgres.cur.execute.call_args.kwargs["parameters"] == {
+        "emote_ids": [1, 2],
+        "guild_ids": [10, None],
+        "usable": [None, True],
+        "has_roles": [False, True],
+        "names": ["a", "b"],
+    }
+
+
+@pytest.mark.asyncio
+async def test_get_emote_hashes_uncached_keeps_null(postgres):
+    postgres.cur.fetchall.side_effect = [[(1, "a"), (2, None)]]
+    assert await postgres.get_emote_hashes([1, 2]) == {"a": 1, None: 2}
+
+
+@pytest.mark.asyncio
+async def test_get_emote_hashes_cached_keeps_null(hash_cached_postgres):
+    hash_cached_postgres.cur.fetchall.side_effect = [[(2, None)]]
+    # The same rows as without a cache, from the database and then from the cache
+    assert await hash_cached_postgres.get_emote_hashes([1, 2]) == {"a": 1, None: 2}
+    assert await hash_cached_postgres.get_emote_hashes([1, 2]) == {"a": 1, None: 2}
+    assert await hash_cached_postgres.get_emote_hash(2) is None
+    assert hash_cached_postgres._cached_emote_hash(2) is None
+    assert hash_cached_postgres.cur.execute.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_emote_hash_read_racing_invalidation(hash_cached_postgres):
+    cache = hash_cached_postgres.emote_hash_cache
+
+    async def fetchall():
+        # Another task rehashes emote 2 while our read is in flight
+        cache.pop(2)
+        return [(2, "old")]
+
+    hash_cached_postgres.cur.fetchall = fetchall
+    assert await hash_cached_postgres.get_emote_hash(2) == "old"
+    assert 2 not in cache
@@ -0,0 +1,60 @@
+import asyncio
+
+import pytest
+from mock import MagicMock, AsyncMock
+
+from sql_helper import EmoteHashCache, ExpiringCache
+
+
+def test_expiring_cache_generation():
+    cache = ExpiringCache(10)
+    generation = cache.generation()
+    cache.pop(1)
+    cache.set(1, "stale", generation)
+    cache.set(2, "b", generation)
+    assert cache.get(1) is None
+    assert cache.get(2) == "b"
+    cache.set(1, "a", cache.generation())
+    assert cache.get(1) == "a"
+
+
+def test_expiring_cache_forgets_old_pops():
+    cache = ExpiringCache(2)
+    generation = cache.generation()
+    for key in range(3):
+        cache.pop(key)
+    # Key 0's pop was forgotten, so it's assumed to have happened as late as possible
+    cache.set(0, "a", generation)
+    assert cache.get(0) is None
+    cache.set(0, "a", cache.generation())
+    assert cache.get(0) == "a"
+
+
+def test_expiring_cache_max_age():
+    cache = ExpiringCache(10, max_age=-1)
+    cache.set(1, "a")
+    assert cache.get(1) is None
+    assert len(cache) == 0
+
+
+@pytest.mark.asyncio
+async def test_emote_hash_cache_listen():
+    cache = EmoteHashCache()
+    cache.set(1, "a")
+    conn = MagicMock()
+    conn.cursor.return_value.__aenter__.return_value = AsyncMock()
+    conn.notifies = asyncio.Queue()
+    pool = MagicMock()
+    pool.acquire.return_value.__aenter__.return_value = conn
+    task = asyncio.create_task(cache.listen(pool))
+    await asyncio.sleep(0)
+    assert 1 not in cache
+    cache.set(1, "a")
+    cache.set(2, "b")
+    conn.notifies.put_nowait(MagicMock(payload="1"))
+    await asyncio.sleep(0)
+    assert 1 not in cache
+    assert cache.get(2) == "b"
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
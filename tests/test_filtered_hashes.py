@@ -0,0 +1,110 @@
+import asyncio
+import subprocess
+import sys
+
+import pytest
+from mock import MagicMock, AsyncMock
+
+from sql_helper import FilteredHashes
+from sql_helper.filtered_hashes import BloomFilter
+from .base import *
+
+
+@pytest.fixture
+def filtered_postgres(postgres):
+    postgres.filtered_hashes = FilteredHashes(capacity=2, metric=MagicMock())
+    postgres.filtered_hashes.load(["a", "b"])
+    return postgres
+
+
+def test_bloom_filter_no_false_negatives():
+    bloom = BloomFilter(100)
+    keys = [str(i) for i in range(100)]
+    for key in keys:
+        bloom.add(key)
+    assert all(key in bloom for key in keys)
+    assert sum(str(i) in bloom for i in range(100, 1100)) < 50
+
+
+def test_filtered_hashes_grows():
+    filtered = FilteredHashes(capacity=2)
+    filtered.update(["a", "b", "c", "d", "e"])
+    assert all(i in filtered for i in "abcde")
+    assert "f" not in filtered
+    assert len(filtered) == 5
+
+
+@pytest.mark.asyncio
+async def test_is_emote_hash_filtered(filtered_postgres):
+    assert await filtered_postgres.is_emote_hash_filtered("a")
+    assert not await filtered_postgres.is_emote_hash_filtered("c")
+    assert filtered_postgres.cur.execute.call_count == 0
+    filtered_postgres.filtered_hashes.metric.labels.assert_any_call(result="hit")
+
+
+@pytest.mark.asyncio
+async def test_get_all_emote_hashes_filtered(filtered_postgres):
+    rtn = await filtered_postgres.get_all_emote_hashes_filtered(["a", "c", "b"])
+    assert rtn == {"a", "b"}
+    assert filtered_postgres.cur.execute.call_count == 0
+
+
+@pytest.mark.asyncio
+async def test_get_emote_ids_globally_filtered(filtered_postgres):
+    filtered_postgres.cur.fetchall.side_effect = [[(1, "a"), (2, "c")]]
+    rtn = await filtered_postgres.get_emote_ids_globally_filtered([1, 2, 3])
+    assert rtn == {1}
+    filtered_postgres.filtered_hashes.load([])
+    assert await filtered_postgres.get_emote_ids_globally_filtered([1, 2, 3]) == set()
+    assert filtered_postgres.cur.execute.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_mark_emote_hash_filtered(filtered_postgres):
+    await filtered_postgres.mark_emote_hash_filtered("c")
+    assert await filtered_postgres.is_emote_hash_filtered("c")
+    assert filtered_postgres.cur.execute.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_listen_loaded_after_last_page():
+    filtered = FilteredHashes()
+    pages = [[("a",), ("b",)], [("c",)]]
+
+    async def fetchall():
+        # Still paging, so lookups must go to the database
+        assert not filtered.loaded
+        return pages.pop(0)
+
+    cur = MagicMock()
+    cur.execute = AsyncMock()
+    cur.fetchall = fetchall
+    conn = MagicMock()
+    conn.cursor.return_value.__aenter__.return_value = cur
+    conn.notifies = asyncio.Queue()
+    pool = MagicMock()
+    pool.acquire.return_value.__aenter__.return_value = conn
+    task = asyncio.create_task(filtered.listen(pool, batch_size=2))
+    await asyncio.sleep(0)
+    assert filtered.loaded
+    assert all(emote_hash in filtered for emote_hash in "abc")
+    conn.notifies.put_nowait(MagicMock(payload="d"))
+    await asyncio.sleep(0)
+    assert "d" in filtered
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert not filtered.loaded
+
+
+def test_import_without_metrics_dependencies():
+    # prometheus_client is optional, FilteredHashes only takes a Counter someone else made
+    subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import sys; sys.modules['prometheus_client'] = sys.modules['sentry_sdk'] = None; "
+            "import sql_helper.filtered_hashes",
+        ],
+        check=True,
+    )
@@ -0,0 +1,157 @@
+import pytest
+from mock import MagicMock
+
+from sql_helper import GuildMemberCache, MemberSyncResult, MutualGuildsCache
+from .base import *
+
+
+@pytest.mark.asyncio
+async def test_set_user_guilds(postgres):
+    postgres.cur.fetchall.return_value = [([3, 4], [1])]
+    assert await postgres.set_user_guilds(5, [2, 3, 4]) == MemberSyncResult(2, 1)
+    assert postgres.cur.execute.call_count == 1
+    assert postgres.cur.execute.call_args.kwargs["parameters"] == {
+        "user_id": 5,
+        "guild_ids": [2, 3, 4],
+    }
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("replace", [True, False])
+async def test_sync_guild_members(postgres, replace: bool):
+    postgres.cur.begin = MagicMock()
+    postgres.cur.fetchall.return_value = [([3, 4, 5], [1] if replace else [])]
+    result = await postgres.sync_guild_members(
+        7, iter(range(2, 7)), replace=replace, chunk_size=2
+    )
+    assert result == MemberSyncResult(3, 1 if replace else 0)
+    staged = [
+        call.kwargs["parameters"]["user_ids"]
+        for call in postgres.cur.execute.call_args_list
+        if "INSERT INTO member_sync" in call.args[0]
+    ]
+    assert staged == [[2, 3], [4, 5], [6]]
+    assert postgres.cur.execute.call_args.kwargs["parameters"] == {
+        "guild_id": 7,
+        "replace": replace,
+    }
+    postgres.cur.begin.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_random_members_uncached(postgres):
+    postgres.cur.fetchall.return_value = [(1,), (2,)]
+    assert await postgres.random_members(7, 2) == [1, 2]
+    assert postgres.cur.execute.call_args.kwargs["parameters"] == {
+        "guild_id": 7,
+        "k": 2,
+    }
+    postgres.cur.fetchall.return_value = []
+    assert await postgres.random_member(7) is None
+
+
+@pytest.mark.asyncio
+async def test_random_members_cached(postgres):
+    postgres.guild_member_cache = GuildMemberCache()
+    postgres.cur.fetchall.return_value = [(i,) for i in range(100)]
+    sample = await postgres.random_members(7, 10)
+    assert len(set(sample)) == 10
+    assert set(sample) <= set(range(100))
+    assert len(await postgres.random_members(7, 1000)) == 100
+    assert await postgres.random_member(7) in range(100)
+    assert postgres.cur.execute.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_random_members_invalidated(postgres):
+    postgres.guild_member_cache = GuildMemberCache()
+    postgres.cur.fetchall.return_value = [(1,)]
+    assert await postgres.random_members(7, 1) == [1]
+    postgres.cur.fetchall.return_value = [([7], [])]
+    await postgres.set_user_guilds(2, [7])
+    postgres.cur.fetchall.return_value = [(2,)]
+    assert await postgres.random_members(7, 1) == [2]
+
+
+def test_guild_member_cache():
+    cache = GuildMemberCache(max_age=-1)
+    cache.set(1, [1, 2], cache.generation())
+    assert cache.get(1) is None
+    cache = GuildMemberCache()
+    generation = cache.generation()
+    cache.invalidate(1)
+    cache.set(1, [1, 2], generation)
+    assert cache.get(1) is None
+    cache.set(1, [1, 2], cache.generation())
+    assert list(cache.get(1)) == [1, 2]
+
+
+def test_guild_member_cache_other_guild_invalidated():
+    cache = GuildMemberCache()
+    generation = cache.generation()
+    cache.invalidate(999)
+    cache.set(1, [1, 2, 3], generation)
+    assert list(cache.get(1)) == [1, 2, 3]
+
+
+@pytest.mark.asyncio
+async def test_sync_guild_members_invalidates(postgres):
+    postgres.cur.begin = MagicMock()
+    postgres.guild_member_cache = GuildMemberCache()
+    postgres.guild_member_cache.set(7, [1], 0)
+    postgres.guild_member_cache.set(2, [1], 0)
+    postgres.cur.fetchall.return_value = [([2], [])]
+    await postgres.sync_guild_members(7, [1, 2])
+    assert postgres.guild_member_cache.get(7) is None
+    assert list(postgres.guild_member_cache.get(2)) == [1]
+
+
+@pytest.mark.asyncio
+async def test_mutual_guild_ids_many(postgres):
+    postgres.cur.fetchall.return_value = [(1, [10, 11]), (2, [10])]
+    assert await postgres.mutual_guild_ids_many([1, 2, 3, 1]) == {
+        1: {10, 11},
+        2: {10},
+        3: set(),
+    }
+    assert postgres.cur.execute.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_mutual_guild_ids_many_cached(postgres):
+    postgres.mutual_guilds_cache = MutualGuildsCache(10)
+    postgres.cur.fetchall.return_value = [(1, [10, 11])]
+    await postgres.mutual_guild_ids_many([1, 2])
+    assert await postgres.mutual_guild_ids_many([1, 2]) == {1: {10, 11}, 2: set()}
+    assert sorted(await postgres.mutual_guild_ids(1)) == [10, 11]
+    assert postgres.cur.execute.call_count == 1
+    postgres.cur.fetchall.return_value = [([12], [10, 11])]
+    await postgres.set_user_guilds(1, [12])
+    postgres.cur.fetchall.return_value = [(1, [12])]
+    assert await postgres.mutual_guild_ids_many([1, 2]) == {1: {12}, 2: set()}
+    assert postgres.cur.execute.call_args.kwargs["parameters"] == {"user_ids": [1]}
+
+
+@pytest.mark.asyncio
+async def test_mutual_guild_ids_many_read_racing_write(postgres):
+    cache = postgres.mutual_guilds_cache = MutualGuildsCache(10)
+
+    async def fetchall():
+        # Another connection changes user 1's guilds while the read is in flight
+        cache.pop(1)
+        return [(1, [10]), (2, [11])]
+
+    postgres.cur.fetchall.side_effect = fetchall
+    assert await postgres.mutual_guild_ids_many([1, 2]) == {1: {10}, 2: {11}}
+    assert 1 not in cache
+    assert cache.get(2) == {11}
+
+
+@pytest.mark.asyncio
+async def test_mutual_guild_ids_sorted(postgres):
+    postgres.cur.fetchall.return_value = [(12,), (10,), (11,)]
+    assert await postgres.mutual_guild_ids(1) == [10, 11, 12]
+    postgres.mutual_guilds_cache = MutualGuildsCache(10)
+    postgres.cur.fetchall.return_value = [(1, [12, 10, 11])]
+    assert await postgres.mutual_guild_ids(1) == [10, 11, 12]
+    assert await postgres.mutual_guild_ids(1) == [10, 11, 12]
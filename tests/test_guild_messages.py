@@ -4,6 +4,7 @@ import pytest
 from hypothesis import given, HealthCheck, settings, assume
 from hypothesis.strategies import integers, none, one_of
 
+from sql_helper import GuildMessage
 from .base import *
 
 
@@ -57,6 +58,7 @@ async def test_get_guild_messages(
             "channel_id": channel_id,
             "user_id": user_id,
             "after_id": after,
+            "before_id": None,
             "offset": offset,
             "limit": no_results,
         }
@@ -79,3 +81,63 @@ def _assert_sql_if_not_none(value: Optional[Any], sql: str, query: str):
         assert sql not in query
     else:
         assert sql in query
+
+
+@pytest.mark.asyncio
+async def test_get_guild_messages_page(postgres):
+    rows = [(1, 2, message_id, 3) for message_id in range(1, 8)]
+    results = []
+
+    def _execute_side_effect(query: str, parameters):
+        assert "OFFSET" not in query
+        matching = rows
+        if parameters["before_id"] is not None:
+            assert "message_id < %(before_id)s" in query
+            matching = [i for i in matching if i[2] < parameters["before_id"]]
+        if parameters["after_id"] is not None:
+            assert "ORDER BY message_id ASC" in query
+            matching = [i for i in matching if i[2] > parameters["after_id"]]
+        else:
+            matching = matching[::-1]
+        results[:] = [matching[: parameters["limit"]]]
+
+    postgres.cur.execute.side_effect = _execute_side_effect
+    postgres.cur.fetchall.side_effect = lambda: results[0]
+
+    async def page(cursor):
+        rtn = await postgres.get_guild_messages_page(guild_id=1, cursor=cursor, limit=3)
+        return [i.message_id for i in rtn.messages], rtn
+
+    ids, first = await page(None)
+    assert ids == [7, 6, 5] and first.after is None
+    ids, second = await page(first.before)
+    assert ids == [4, 3, 2]
+    ids, third = await page(second.before)
+    assert ids == [1] and third.before is None
+    ids, back = await page(third.after)
+    assert ids == [4, 3, 2]
+    ids, back = await page(back.after)
+    assert ids == [7, 6, 5] and back.after is None
+
+
+@pytest.mark.asyncio
+async def test_get_guild_messages_page_invalid_cursor(postgres):
+    with pytest.raises(ValueError):
+        await postgres.get_guild_messages_page(guild_id=1, cursor="nonsense")
+
+
+@pytest.mark.asyncio
+async def test_ingest_guild_messages(postgres):
+    postgres.cur.rowcount = 2
+    messages = (GuildMessage(1, 2, message_id, 3) for message_id in range(5))
+    assert await postgres.ingest_guild_messages(messages, chunk_size=2) == 6
+    assert postgres.cur.execute.call_count == 3
+    query = postgres.cur.execute.call_args.args[0]
+    assert "ON CONFLICT ON CONSTRAINT guild_messages_pk DO NOTHING" in query
+    assert postgres.cur.execute.call_args.kwargs["parameters"]["message_ids"] == [4]
+
+
+@pytest.mark.asyncio
+async def test_ingest_guild_messages_empty(postgres):
+    assert await postgres.ingest_guild_messages(iter([])) == 0
+    assert postgres.cur.execute.call_count == 0
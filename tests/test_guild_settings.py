@@ -0,0 +1,205 @@
+import pytest
+from mock import MagicMock
+
+from sql_helper import GuildSettings, GuildSettingsCache, GuildSettingsStore
+from sql_helper.guild_settings import DEFAULTS
+from sql_helper.guild_settings_cache import MISSING
+from .base import *
+
+
+def _settings_row(guild_id: int, prefix: str = "!"):
+    settings = GuildSettings(guild_id, prefix=prefix)
+    return tuple(settings.__dict__.values())
+
+
+@pytest.fixture
+def cached_postgres(postgres):
+    postgres.guild_settings_cache = GuildSettingsCache(maxsize=2)
+    return postgres
+
+
+@pytest.mark.asyncio
+async def test_get_guild_settings_cached(cached_postgres):
+    cached_postgres.cur.fetchall.side_effect = [[_settings_row(1)]]
+    assert await cached_postgres.get_guild_settings(1) == GuildSettings(1)
+    assert await cached_postgres.get_guild_settings(1) == GuildSettings(1)
+    assert cached_postgres.cur.execute.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_get_guild_settings_cached_missing(cached_postgres):
+    cached_postgres.cur.fetchall.side_effect = [[]]
+    assert await cached_postgres.get_guild_settings(1) is None
+    assert await cached_postgres.get_guild_settings(1) is None
+    assert cached_postgres.cur.execute.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_get_guild_settings_cached_copy(cached_postgres):
+    cached_postgres.cur.fetchall.side_effect = [[_settings_row(1)]]
+    settings = await cached_postgres.get_guild_settings(1)
+    settings.prefix = "?"
+    assert (await cached_postgres.get_guild_settings(1)).prefix == "!"
+
+
+@pytest.mark.asyncio
+async def test_get_guild_settings_evicts(cached_postgres):
+    cached_postgres.cur.fetchall.side_effect = [
+        [_settings_row(1)],
+        [_settings_row(2)],
+        [_settings_row(3)],
+        [_settings_row(1)],
+    ]
+    for guild_id in (1, 2, 3, 1):
+        assert (await cached_postgres.get_guild_settings(guild_id)).guild_id == guild_id
+    assert cached_postgres.cur.execute.call_count == 4
+
+
+@pytest.mark.asyncio
+async def test_set_guild_settings_invalidates(cached_postgres):
+    cached_postgres.cur.fetchall.side_effect = [
+        [_settings_row(1)],
+        [_settings_row(1, prefix="?")],
+    ]
+    await cached_postgres.get_guild_settings(1)
+    await cached_postgres.set_guild_settings(GuildSettings(1, prefix="?"))
+    query = cached_postgres.cur.execute.call_args.args[0]
+    assert "pg_notify(%(channel)s, guild_id::text)" in query
+    assert (await cached_postgres.get_guild_settings(1)).prefix == "?"
+    assert cached_postgres.cur.execute.call_count == 3
+
+
+@pytest.mark.asyncio
+async def test_delete_guild_settings_invalidates(cached_postgres):
+    cached_postgres.cur.fetchall.side_effect = [[_settings_row(1)], []]
+    await cached_postgres.get_guild_settings(1)
+    await cached_postgres.delete_guild_settings(1)
+    assert await cached_postgres.get_guild_settings(1) is None
+    assert cached_postgres.cur.execute.call_count == 3
+
+
+def test_guild_settings_cache_stale_generation():
+    cache = GuildSettingsCache()
+    generation = cache.generation()
+    cache.invalidate(1)
+    cache.set(1, GuildSettings(1), generation)
+    assert cache.get(1) is MISSING
+    # Other guilds are still cached
+    cache.set(2, GuildSettings(2), generation)
+    assert cache.get(2) == GuildSettings(2)
+    generation = cache.generation()
+    cache.clear()
+    cache.set(2, GuildSettings(2), generation)
+    assert cache.get(2) is MISSING
+
+
+def test_guild_settings_cache_invalidations_bounded():
+    cache = GuildSettingsCache(maxsize=2)
+    generation = cache.generation()
+    for guild_id in range(100):
+        cache.invalidate(guild_id)
+    assert len(cache._popped) == 2
+    # Forgotten invalidations still count against reads that started before them
+    cache.set(1, GuildSettings(1), generation)
+    assert cache.get(1) is MISSING
+    cache.set(1, GuildSettings(1), cache.generation())
+    assert cache.get(1) == GuildSettings(1)
+
+
+def test_guild_settings_store_round_trip():
+    store = GuildSettingsStore()
+    settings = [
+        GuildSettings(1),
+        GuildSettings(2, prefix="?", nitro_role=5, enable_pings=False),
+        GuildSettings(3, locale=None, max_guildwide_emotes=None, is_alias_server=True),
+    ]
+    for i in settings:
+        store.add(i)
+    assert len(store) == 3
+    for i in settings:
+        assert store.get(i.guild_id) == i
+    assert store.get(4) is None
+    assert store.flags(1) == DEFAULTS
+    assert store.prefix(2) == "?"
+
+
+def test_guild_settings_store_update_and_discard():
+    store = GuildSettingsStore()
+    for guild_id in (1, 2, 3):
+        store.add(GuildSettings(guild_id))
+    store.add(GuildSettings(2, prefix="?"))
+    assert len(store) == 3
+    assert store.get(2).prefix == "?"
+    store.discard(1)
+    store.discard(4)
+    assert 1 not in store
+    assert sorted(store) == [2, 3]
+    assert store.get(2) == GuildSettings(2, prefix="?")
+    assert store.get(3) == GuildSettings(3)
+
+
+@pytest.mark.asyncio
+async def test_guild_settings_store_load(postgres):
+    postgres.cur.fetchall.side_effect = [
+        [_settings_row(1), _settings_row(2), _settings_row(3)]
+    ]
+    store = await postgres.guild_settings_store()
+    assert sorted(store) == [1, 2, 3]
+    assert postgres.cur.execute.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_guild_settings_store_batch_size(postgres):
+    postgres.cur.begin = MagicMock()
+    postgres.cur.fetchall.side_effect = [
+        [_settings_row(1), _settings_row(2)],
+        [_settings_row(3)],
+    ]
+    store = await postgres.guild_settings_store(batch_size=2)
+    assert sorted(store) == [1, 2, 3]
+    queries = [call.args[0] for call in postgres.cur.execute.call_args_list]
+    assert queries[1].startswith("FETCH FORWARD 2 FROM sql_helper_stream_")
+    assert len(queries) == 4
+
+
+@pytest.mark.asyncio
+async def test_guild_settings_stream_closed_on_exit(postgres):
+    postgres.stream_batch_size = 2
+    cur = postgres.cur
+    cur.begin = MagicMock()
+    cur.fetchall.side_effect = [[_settings_row(1), _settings_row(2)]]
+    async for _ in postgres.guild_settings():
+        break
+    cur.begin.return_value.__aexit__.assert_not_called()
+    await postgres.__aexit__(None, None, None)
+    assert cur.execute.call_args.args[0].startswith("CLOSE sql_helper_stream_")
+    cur.begin.return_value.__aexit__.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_guild_settings_stream_in_transaction(postgres):
+    postgres.stream_batch_size = 2
+    postgres.cur.begin = MagicMock()
+    postgres.conn = MagicMock()
+    postgres.cur.fetchall.side_effect = [[_settings_row(1)]]
+    assert [settings.guild_id async for settings in postgres.guild_settings()] == [1]
+    postgres.cur.begin.assert_not_called()
+    queries = [call.args[0] for call in postgres.cur.execute.call_args_list]
+    assert queries[-1].startswith("CLOSE sql_helper_stream_")
+
+
+@pytest.mark.asyncio
+async def test_guild_settings_streamed(postgres):
+    postgres.stream_batch_size = 2
+    postgres.cur.begin = MagicMock()
+    postgres.cur.fetchall.side_effect = [
+        [_settings_row(1), _settings_row(2)],
+        [_settings_row(3)],
+    ]
+    guild_ids = [settings.guild_id async for settings in postgres.guild_settings()]
+    assert guild_ids == [1, 2, 3]
+    queries = [call.args[0] for call in postgres.cur.execute.call_args_list]
+    assert queries[0].startswith("DECLARE sql_helper_stream_")
+    assert queries[1].startswith("FETCH FORWARD 2 FROM sql_helper_stream_")
+    assert queries[3].startswith("CLOSE sql_helper_stream_")
+    assert len(queries) == 4
@@ -0,0 +1,53 @@
+import pytest
+from mock import MagicMock
+
+from .base import *
+
+
+def get_webhook(webhook_id: int, channel_id: int = 2, name: str = "hook"):
+    webhook = MagicMock(spec=["id", "guild_id", "channel_id", "token", "name", "user"])
+    webhook.id = webhook_id
+    webhook.guild_id = 1
+    webhook.channel_id = channel_id
+    webhook.token = f"token{webhook_id}"
+    webhook.name = name
+    webhook.user.id = 9
+    return webhook
+
+
+@pytest.mark.asyncio
+async def test_set_channel_webhooks(postgres):
+    await postgres.set_channel_webhooks(
+        2, [get_webhook(10), get_webhook(11), get_webhook(10, name="new")]
+    )
+    assert postgres.cur.execute.call_count == 1
+    query = postgres.cur.execute.call_args.args[0]
+    assert "webhooks.channel_id=%(channel_id)s" in query
+    assert postgres.cur.execute.call_args.kwargs["parameters"] == {
+        "channel_id": 2,
+        "delete": True,
+        "webhook_ids": [10, 11],
+        "guild_ids": [1, 1],
+        "channel_ids": [2, 2],
+        "tokens": ["token10", "token11"],
+        "names": ["new", "hook"],
+        "user_ids": [9, 9],
+    }
+
+
+@pytest.mark.asyncio
+async def test_set_channel_webhooks_no_delete(postgres):
+    await postgres.set_channel_webhooks(2, [], delete=False)
+    postgres.cur.execute.assert_not_called()
+    await postgres.set_channel_webhooks(2, [])
+    assert postgres.cur.execute.call_args.kwargs["parameters"]["webhook_ids"] == []
+
+
+@pytest.mark.asyncio
+async def test_set_guild_webhooks(postgres):
+    await postgres.set_guild_webhooks(1, [get_webhook(10, 2), get_webhook(11, 3)])
+    assert postgres.cur.execute.call_count == 1
+    assert "webhooks.guild_id=%(guild_id)s" in postgres.cur.execute.call_args.args[0]
+    parameters = postgres.cur.execute.call_args.kwargs["parameters"]
+    assert parameters["guild_id"] == 1
+    assert parameters["channel_ids"] == [2, 3]
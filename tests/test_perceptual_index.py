@@ -0,0 +1,134 @@
+import random
+
+import pytest
+from mock import MagicMock, AsyncMock
+
+from sql_helper import PerceptualIndex
+from .base import *
+
+
+@pytest.mark.parametrize("bands", [1, 3, 9])
+def test_search_matches_brute_force(bands: int):
+    rng = random.Random(0)
+    hashes = {emote_id: f"{rng.getrandbits(64):016x}" for emote_id in range(2000)}
+    # Near duplicates of the first few, and one too long for the bands
+    for emote_id in range(2000, 2100):
+        flips = sum(1 << bit for bit in rng.sample(range(64), rng.randrange(12)))
+        hashes[emote_id] = f"{int(hashes[emote_id % 20], 16) ^ flips:016x}"
+    hashes[2100] = "1" + hashes[0]
+    index = PerceptualIndex(bands=bands)
+    for emote_id, emote_hash in hashes.items():
+        index.add(emote_id, emote_hash)
+    for query in list(hashes.values())[:20] + [hashes[2100]]:
+        expected = sorted(
+            (
+                (emote_id, bin(int(emote_hash, 16) ^ int(query, 16)).count("1"))
+                for emote_id, emote_hash in hashes.items()
+            ),
+            key=lambda result: (result[1], result[0]),
+        )
+        for max_distance in (0, 2, 5, 8, 24):
+            assert index.search(query, max_distance) == [
+                r for r in expected if r[1] <= max_distance
+            ]
+
+
+def test_remove_leaves_nothing_behind():
+    index = PerceptualIndex()
+    for emote_id in range(100):
+        index.add(emote_id, f"{emote_id * 7919:016x}")
+        index.add(emote_id + 100, f"{emote_id * 7919:016x}")
+    index.add(200, "1" + "0" * 16)
+    for emote_id in range(201):
+        index.remove(emote_id)
+    assert len(index) == 0
+    assert index._emote_ids == {}
+    assert index._overflow == set()
+    assert all(table == {} for table in index._tables)
+
+
+def test_add_remove():
+    index = PerceptualIndex()
+    index.add(1, "ff00")
+    index.add(2, "ff01")
+    index.add(3, "00ff")
+    index.add(4, None)
+    index.add(5, "not hex")
+    assert len(index) == 3
+    assert index.search("ff00", 1) == [(1, 0), (2, 1)]
+    index.add(2, "00fe")
+    assert index.search("ff00", 1) == [(1, 0)]
+    assert index.search("00ff", 1) == [(3, 0), (2, 1)]
+    index.remove(3)
+    index.remove(3)
+    assert 3 not in index
+    assert index.search("00ff", 1) == [(2, 1)]
+    index.add(3, "00ff")
+    assert index.search("00ff", 0) == [(3, 0)]
+
+
+@pytest.mark.asyncio
+async def test_load():
+    conn = AsyncMock()
+    conn.get_all_emotes_min.side_effect = [
+        [get_sql_emoji(1, "ff"), get_sql_emoji(2, "fe")],
+        [get_sql_emoji(3, "0f")],
+    ]
+    sql = MagicMock()
+    sql.return_value.__aenter__.return_value = conn
+    index = PerceptualIndex()
+    await index.load(sql, batch_size=2)
+    assert index.loaded
+    assert len(index) == 3
+    assert [call.args for call in conn.get_all_emotes_min.await_args_list] == [
+        (0, 2),
+        (2, 2),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_reload_swaps_in_new_tree():
+    index = PerceptualIndex()
+    index.loaded = True
+    index.add(1, "ff")
+    index.add(2, "f0")
+
+    async def get_all_emotes_min(min_id, limit):
+        # Searches still see the old tree, and changes made meanwhile aren't lost
+        assert index.loaded
+        assert index.search("ff", 0) == [(1, 0)]
+        index.add(3, "0f")
+        index.add(1, "ee")
+        index.remove(2)
+        return [get_sql_emoji(1, "fe"), get_sql_emoji(2, "f0")]
+
+    conn = AsyncMock()
+    conn.get_all_emotes_min.side_effect = get_all_emotes_min
+    sql = MagicMock()
+    sql.return_value.__aenter__.return_value = conn
+    await index.load(sql)
+    assert index.loaded
+    assert sorted(index._hashes) == [1, 3]
+    assert index.search("ee", 0) == [(1, 0)]
+    assert index.search("0f", 0) == [(3, 0)]
+
+
+@pytest.mark.asyncio
+async def test_bulk_update_updates_index(postgres):
+    postgres.perceptual_index = PerceptualIndex()
+    postgres.perceptual_index.add(1, "ff")
+    await postgres.bulk_update_emote_perceptual_hash_data(
+        [{"id": 1, "animated": False, "sha": "a", "perceptual": "00"}]
+    )
+    assert postgres.perceptual_index.search("00", 0) == [(1, 0)]
+
+
+@pytest.mark.asyncio
+async def test_near_duplicate_emote_ids(postgres):
+    postgres.perceptual_index = PerceptualIndex()
+    postgres.perceptual_index.loaded = True
+    postgres.perceptual_index.add(1, "ff")
+    postgres.perceptual_index.add(2, "fe")
+    postgres.perceptual_index.add(3, "00")
+    postgres.cur.fetchall.return_value = [(1, "ff")]
+    assert await postgres.near_duplicate_emote_ids(1, 2) == [(2, 1)]
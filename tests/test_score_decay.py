@@ -0,0 +1,69 @@
+import asyncio
+
+import pytest
+from mock import MagicMock, AsyncMock
+
+from sql_helper import DecayCheckpoint, ScoreDecay
+from .base import *
+
+
+@pytest.fixture
+def conn():
+    conn = AsyncMock()
+    conn.decay_guild_emote_score_chunk.side_effect = [(10, 3), (20, 1), (None, 0)]
+    return conn
+
+
+@pytest.fixture
+def sql(conn):
+    sql = MagicMock()
+    sql.return_value.__aenter__.return_value = conn
+    return sql
+
+
+@pytest.mark.asyncio
+async def test_score_decay(sql, conn):
+    progress = []
+    decay = ScoreDecay(
+        sql, chunk_size=10, on_progress=lambda c: progress.append(c.last_emote_id)
+    )
+    checkpoint = await decay.run()
+    assert checkpoint == DecayCheckpoint(20, 4, 3, True)
+    assert progress == [10, 20, 20]
+    assert [
+        call.args for call in conn.decay_guild_emote_score_chunk.await_args_list
+    ] == [(0, 10), (10, 10), (20, 10)]
+    # A connection per chunk
+    assert sql.call_count == 3
+
+
+@pytest.mark.asyncio
+async def test_score_decay_resume(sql, conn):
+    decay = ScoreDecay(sql, checkpoint=DecayCheckpoint(10, 3, 1))
+    checkpoint = await decay.run()
+    assert conn.decay_guild_emote_score_chunk.await_args_list[0].args == (10, 1000)
+    assert checkpoint.done
+
+
+@pytest.mark.asyncio
+async def test_score_decay_pause(sql, conn):
+    decay = ScoreDecay(sql)
+    decay.pause()
+    task = asyncio.create_task(decay.run())
+    await asyncio.sleep(0)
+    assert decay.checkpoint.chunks == 0
+    decay.resume()
+    checkpoint = await task
+    assert checkpoint.chunks == 3
+
+
+@pytest.mark.asyncio
+async def test_decay_guild_emote_score(postgres):
+    postgres.cur.fetchall.side_effect = [[(5, 2)], [(None, 0)]]
+    assert await postgres.decay_guild_emote_score(chunk_size=5) == 2
+    assert postgres.cur.execute.call_count == 2
+    # Chunks send only their own bounds
+    assert postgres.cur.execute.call_args.kwargs["parameters"] == {
+        "after_emote_id": 5,
+        "limit": 5,
+    }
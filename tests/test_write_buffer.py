@@ -0,0 +1,138 @@
+import asyncio
+
+import pytest
+from mock import MagicMock, AsyncMock
+
+from sql_helper import GuildMessage, WriteBuffer
+
+
+@pytest.fixture
+def conn():
+    return AsyncMock()
+
+
+@pytest.fixture
+def sql(conn):
+    sql = MagicMock()
+    sql.return_value.__aenter__.return_value = conn
+    return sql
+
+
+@pytest.mark.asyncio
+async def test_write_buffer_flushes_when_full(sql, conn):
+    buffer = WriteBuffer(sql, max_size=3)
+    await buffer.add_guild_message(message_id=1, guild_id=2, channel_id=3, user_id=4)
+    await buffer.add_command_message(message_id=5, user_id=4)
+    assert len(buffer) == 2
+    assert sql.call_count == 0
+    await buffer.add_guild_message(message_id=6, guild_id=2, channel_id=3, user_id=4)
+    assert len(buffer) == 0
+    # A connection per table written
+    assert sql.call_count == 2
+    conn.ingest_guild_messages.assert_awaited_once_with(
+        [GuildMessage(2, 3, 1, 4), GuildMessage(2, 3, 6, 4)]
+    )
+    conn.add_command_messages_bulk.assert_awaited_once_with([(5, 4)])
+    assert conn.add_used_emotes.await_count == 0
+
+
+@pytest.mark.asyncio
+async def test_write_buffer_close_flushes(sql, conn):
+    buffer = WriteBuffer(sql, flush_interval=60)
+    buffer.start()
+    await buffer.add_command_message(message_id=5, user_id=4)
+    await buffer.close()
+    conn.add_command_messages_bulk.assert_awaited_once_with([(5, 4)])
+    await buffer.close()
+    assert sql.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_write_buffer_repeated_emote_scores(sql, conn):
+    buffer = WriteBuffer(sql)
+    await buffer.increment_guild_emote_score([(1, 10), (1, 11)])
+    await buffer.increment_guild_emote_score([(1, 10)])
+    await buffer.flush()
+    conn.apply_guild_emote_score_uses.assert_awaited_once_with({(1, 10): 2, (1, 11): 1})
+
+
+@pytest.mark.asyncio
+async def test_write_buffer_duplicate_emote_score_in_one_call(sql, conn):
+    buffer = WriteBuffer(sql)
+    await buffer.increment_guild_emote_score([(1, 10), (1, 10), (1, 11)])
+    await buffer.flush()
+    conn.apply_guild_emote_score_uses.assert_awaited_once_with({(1, 10): 1, (1, 11): 1})
+
+
+@pytest.mark.asyncio
+async def test_write_buffer_close_waits_for_running_flush(sql, conn):
+    flushing = asyncio.Event()
+    release = asyncio.Event()
+
+    async def add_command_messages_bulk(messages):
+        flushing.set()
+        await release.wait()
+
+    conn.add_command_messages_bulk.side_effect = add_command_messages_bulk
+    buffer = WriteBuffer(sql, flush_interval=0)
+    buffer.start()
+    await buffer.add_command_message(message_id=5, user_id=4)
+    await flushing.wait()
+    close = asyncio.create_task(buffer.close())
+    await asyncio.sleep(0)
+    assert not close.done()
+    release.set()
+    await close
+    conn.add_command_messages_bulk.assert_awaited_once_with([(5, 4)])
+
+
+@pytest.mark.asyncio
+async def test_write_buffer_failed_table_is_retried(sql, conn):
+    conn.add_command_messages_bulk.side_effect = [ValueError, None, None]
+    buffer = WriteBuffer(sql, max_size=2)
+    await buffer.add_guild_message(message_id=1, guild_id=2, channel_id=3, user_id=4)
+    # The failure is logged rather than raised into whoever triggered the flush
+    await buffer.add_command_message(message_id=5, user_id=4)
+    conn.ingest_guild_messages.assert_awaited_once_with([GuildMessage(2, 3, 1, 4)])
+    assert len(buffer) == 0
+    await buffer.add_command_message(message_id=6, user_id=4)
+    await buffer.flush()
+    # The retried batch goes separately from new rows
+    assert [
+        call.args[0] for call in conn.add_command_messages_bulk.await_args_list
+    ] == [[(5, 4)], [(5, 4)], [(6, 4)]]
+    await buffer.flush()
+    assert conn.add_command_messages_bulk.await_count == 3
+
+
+@pytest.mark.asyncio
+async def test_write_buffer_isolates_bad_row(sql, conn):
+    written = []
+
+    async def add_command_messages_bulk(messages):
+        if (2, 4) in messages:
+            raise ValueError
+        written.extend(messages)
+
+    conn.add_command_messages_bulk.side_effect = add_command_messages_bulk
+    buffer = WriteBuffer(sql, max_retries=1)
+    for message_id in range(1, 6):
+        await buffer.add_command_message(message_id=message_id, user_id=4)
+    for _ in range(6):
+        await buffer.flush()
+    assert sorted(written) == [(1, 4), (3, 4), (4, 4), (5, 4)]
+    assert buffer._failed == []
+
+
+@pytest.mark.asyncio
+async def test_write_buffer_failed_batches_capped(sql, conn):
+    conn.add_command_messages_bulk.side_effect = ValueError
+    buffer = WriteBuffer(sql, max_size=2)
+    for message_id in range(4):
+        await buffer.add_command_message(message_id=message_id, user_id=4)
+    conn.add_command_messages_bulk.side_effect = None
+    await buffer.flush()
+    # The second batch didn't fit behind the first
+    conn.add_command_messages_bulk.assert_awaited_with([(0, 4), (1, 4)])
+    await buffer.flush()
+    assert conn.add_command_messages_bulk.await_count == 4